@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the cold-start import time of pphelper and its submodules.
+
+Every module is imported in a number of fresh interpreters. For each
+import, we record the wall-clock time of the entire interpreter run (minus
+the time required to start an interpreter that imports nothing), and the
+cumulative import time reported by ``python -X importtime``. The medians
+are reported.
+
+Usage
+-----
+Measure and print the import times::
+
+    python benchmarks/import_time.py
+
+Save the results as a baseline, and compare against it later::
+
+    python benchmarks/import_time.py --save baseline.json
+    python benchmarks/import_time.py --compare baseline.json
+
+When comparing, the script exits with a non-zero status if the import
+time of any module increased by more than the tolerance (see
+``--tolerance``).
+
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+MODULES = ['pphelper', 'pphelper.racemodel', 'pphelper.sdt',
+           'pphelper.image', 'pphelper.utils']
+
+
+def measure_import_time(module, repeats=10):
+    """
+    Import `module` in `repeats` fresh interpreters.
+
+    Returns
+    -------
+    tuple
+        The median wall-clock time and the median cumulative import time
+        reported by ``-X importtime``, both in milliseconds.
+
+    """
+    wall_times = []
+    import_times = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+            stderr=subprocess.PIPE, check=True, universal_newlines=True
+        )
+        wall_times.append(time.perf_counter() - start)
+
+        # The lines have the format:
+        # import time: self [us] | cumulative | imported package
+        for line in process.stderr.splitlines():
+            fields = [field.strip() for field in line.split('|')]
+            if len(fields) == 3 and fields[2] == module:
+                import_times.append(int(fields[1]) / 1000)
+
+    return np.median(wall_times) * 1000, np.median(import_times)
+
+
+def measure_interpreter_startup(repeats=10):
+    """
+    Return the median wall-clock time (in milliseconds) required to start
+    an interpreter that does not import anything.
+
+    """
+    wall_times = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        wall_times.append(time.perf_counter() - start)
+
+    return np.median(wall_times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeats', type=int, default=10,
+                        help='number of fresh interpreters per module')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results to a JSON file')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results to a JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='maximum allowed relative increase of the '
+                             'import time when comparing (default: 0.25)')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    startup = measure_interpreter_startup(args.repeats)
+    print('Interpreter startup: %.1f ms' % startup)
+    print('%-22s %12s %12s' % ('Module', 'Wall [ms]', 'Import [ms]'))
+
+    results = dict()
+    for module in args.modules:
+        wall_time, import_time = measure_import_time(module, args.repeats)
+        results[module] = dict(wall=wall_time - startup,
+                               importtime=import_time)
+        print('%-22s %12.1f %12.1f' % (module, wall_time - startup,
+                                        import_time))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for module, result in sorted(results.items()):
+            if module not in baseline:
+                continue
+
+            before = baseline[module]['importtime']
+            after = result['importtime']
+            if after > before * (1 + args.tolerance):
+                regressions.append(module)
+                print('REGRESSION: %s import time increased from %.1f ms to '
+                      '%.1f ms.' % (module, before, after))
+
+        if regressions:
+            return 1
+
+        print('No regressions.')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,19 @@
 
 """
 from __future__ import print_function, unicode_literals
+import importlib
 from .version import __version__
 
 __all__ = ['racemodel', 'hardware', 'image', 'sdt', 'utils']
+
+
+# The submodules are only imported when they are first accessed, so that
+# ``import pphelper`` does not pull in their (heavy) dependencies.
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
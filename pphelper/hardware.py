@@ -4,12 +4,466 @@ Provides interfaces to laboratory hardware.
 """
 from __future__ import division, unicode_literals
 
-import nidaqmx
+from collections import OrderedDict, deque, namedtuple
+import concurrent.futures
+import json
 import numpy as np
-import threading
-import psychopy.core
+import os
 import socket
+import sys
+import threading
 import time
+import timeit
+import warnings
+
+if sys.version_info > (3, 0):
+    import queue
+else:
+    import Queue as queue
+
+
+# The NI-DAQmx bindings and PsychoPy are slow to import and not required
+# in test mode, so they are only imported on first use.
+def _get_nidaqmx():
+    import nidaqmx
+    return nidaqmx
+
+
+def _get_psychopy_core():
+    import psychopy.core
+    return psychopy.core
+
+
+# timeit.default_timer is time.perf_counter() on Python 3, and the most
+# precise clock available on Python 2, which lacks time.perf_counter().
+_perf_counter = timeit.default_timer
+
+if hasattr(time, 'perf_counter_ns'):
+    _perf_counter_ns = time.perf_counter_ns
+else:
+    def _perf_counter_ns():
+        return int(_perf_counter() * 1e9)
+
+# A module-level reference, so that tests can replace the scheduler's
+# sleep function without affecting other threads.
+_sleep = time.sleep
+
+
+ScheduledEvent = namedtuple('ScheduledEvent', 'scheduled onset lateness')
+
+# On Windows, time.sleep() only uses a high-resolution timer since Python
+# 3.11. Before, sleeping may overshoot by up to one ~15.6 ms timer tick,
+# which the spin window has to cover.
+if sys.platform.startswith('win') and sys.version_info < (3, 11):
+    _default_spin_window = 0.02
+else:
+    _default_spin_window = 0.002
+
+
+class _SimulatedDigitalOutputTask(object):
+    """
+    A stand-in for ``nidaqmx.DigitalOutputTask``, used in test mode.
+
+    Instead of generating any output, all written data is recorded in
+    `written`, and the most recent sample clock configuration is stored in
+    `sample_clock`.
+
+    """
+    def __init__(self, name='', number_of_channels=8):
+        self.name = name
+        self.number_of_channels = number_of_channels
+        self.written = []
+        self.sample_clock = None
+        self.start_trigger = None
+        self.running = False
+
+    def create_channel(self, lines):
+        return True
+
+    def get_number_of_channels(self):
+        return self.number_of_channels
+
+    def configure_timing_sample_clock(self, rate=1, sample_mode='finite',
+                                      samples_per_channel=1000, **kwargs):
+        self.sample_clock = dict(rate=rate, sample_mode=sample_mode,
+                                 samples_per_channel=samples_per_channel)
+        return True
+
+    def configure_trigger_digital_edge_start(self, source, **kwargs):
+        self.start_trigger = source
+        return True
+
+    def write(self, data, auto_start=True, timeout=10.0,
+              layout='group_by_channel'):
+        data = np.array(data, dtype=np.uint8)
+        if layout == 'group_by_scan_number':
+            data = data.reshape(-1, self.number_of_channels)
+        else:
+            data = data.reshape(self.number_of_channels, -1).T
+
+        self.written.append(data)
+        if auto_start:
+            self.running = True
+
+        return data.shape[0]
+
+    def start(self):
+        self.running = True
+        return True
+
+    def wait_until_done(self, timeout=-1):
+        self.running = False
+        return True
+
+    def stop(self):
+        self.running = False
+        return True
+
+    def clear(self):
+        self.running = False
+
+
+class _SimulatedAnalogInputTask(object):
+    """
+    A stand-in for ``nidaqmx.AnalogInputTask``, used in test mode.
+
+    Acquisition progresses in real time at the configured sample rate. An
+    external start trigger is assumed to arrive as soon as the task is
+    started. Sample `i` of channel `c` has the value ``i * (c + 1)``,
+    which allows to check the acquired data for gaps.
+
+    """
+    def __init__(self, name=''):
+        self.name = name
+        self.number_of_channels = 0
+        self.sample_clock = None
+        self.start_trigger = None
+        self._start_time = None
+        self._samples_read = 0
+
+    def create_voltage_channel(self, phys_channel, min_val=-10, max_val=10,
+                               **kwargs):
+        # Count the channels in specifications like `Dev1/ai0:2, Dev1/ai5`.
+        for channel in phys_channel.split(','):
+            first, _, last = channel.strip().partition(':')
+            if last:
+                n_digits = len(first) - len(first.rstrip('0123456789'))
+                self.number_of_channels += int(last) - \
+                    int(first[-n_digits:]) + 1
+            else:
+                self.number_of_channels += 1
+        return True
+
+    def configure_timing_sample_clock(self, rate=1, sample_mode='finite',
+                                      samples_per_channel=1000, **kwargs):
+        self.sample_clock = dict(rate=rate, sample_mode=sample_mode,
+                                 samples_per_channel=samples_per_channel)
+        return True
+
+    def configure_trigger_digital_edge_start(self, source, **kwargs):
+        self.start_trigger = source
+        return True
+
+    def get_number_of_channels(self):
+        return self.number_of_channels
+
+    def start(self):
+        self._start_time = _perf_counter()
+        self._samples_read = 0
+        return True
+
+    def stop(self):
+        self._start_time = None
+        return True
+
+    def clear(self):
+        self.stop()
+
+    def _get_samples_acquired(self):
+        # The task may be stopped from another thread at any time.
+        start_time = self._start_time
+        if start_time is None:
+            raise IOError('Task has been stopped.')
+
+        samples = int((_perf_counter() - start_time) *
+                      self.sample_clock['rate'])
+        if self.sample_clock['sample_mode'] == 'finite':
+            samples = min(samples, self.sample_clock['samples_per_channel'])
+        return samples
+
+    def wait_until_done(self, timeout=-1):
+        samples = self.sample_clock['samples_per_channel']
+        time.sleep(max(self._start_time +
+                       samples / self.sample_clock['rate'] -
+                       _perf_counter(), 0))
+        return True
+
+    def read(self, samples_per_channel=None, timeout=10.0,
+             fill_mode='group_by_scan_number'):
+        if samples_per_channel is None:
+            if self.sample_clock['sample_mode'] == 'finite':
+                samples_per_channel = (
+                    self.sample_clock['samples_per_channel'] -
+                    self._samples_read
+                )
+            else:
+                samples_per_channel = (self._get_samples_acquired() -
+                                       self._samples_read)
+
+        stop = self._samples_read + samples_per_channel
+        while self._get_samples_acquired() < stop:
+            time.sleep(0.001)
+
+        samples = np.arange(self._samples_read, stop, dtype=np.float64)
+        channels = np.arange(1, self.number_of_channels + 1)
+        self._samples_read = stop
+
+        if fill_mode == 'group_by_channel':
+            return channels[:, np.newaxis] * samples
+        else:
+            return samples[:, np.newaxis] * channels
+
+
+class _RingBuffer(object):
+    """
+    A buffer holding the most recent samples of a multi-channel signal.
+
+    The data is stored in an array of shape ``(channels, 2 * capacity)``.
+    Every sample is written twice, at its position in the ring and
+    `capacity` samples later. Any `capacity` consecutive samples are thus
+    stored contiguously, and can be returned as a view without copying.
+
+    """
+    def __init__(self, n_channels, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self.samples_written = 0
+        self._data = np.zeros((n_channels, 2 * capacity), dtype=dtype)
+
+    def write(self, chunk):
+        """
+        Append a chunk of shape ``(channels, samples)`` to the buffer.
+
+        """
+        n_samples = chunk.shape[1]
+        if n_samples > self.capacity:
+            raise ValueError('The chunk is larger than the buffer.')
+
+        start = self.samples_written % self.capacity
+        n_first = min(n_samples, self.capacity - start)
+        n_rest = n_samples - n_first
+
+        for offset in (0, self.capacity):
+            self._data[:, start + offset:start + offset + n_first] = \
+                chunk[:, :n_first]
+            self._data[:, offset:offset + n_rest] = chunk[:, n_first:]
+
+        # Only publish the new samples once they have been written.
+        self.samples_written += n_samples
+
+    def get(self, start, stop, samples_written=None):
+        """
+        Return a read-only view of the samples with the absolute indices
+        ``start`` to ``stop - 1``.
+
+        The request is validated against `samples_written`, which defaults
+        to the current number of samples written. Pass the value the
+        indices were derived from, as the writer may add samples meanwhile.
+
+        """
+        if samples_written is None:
+            samples_written = self.samples_written
+
+        if not (samples_written - self.capacity <= start <= stop <=
+                samples_written):
+            raise ValueError('Samples %d to %d are not available. The '
+                             'buffer holds samples %d to %d.'
+                             % (start, stop,
+                                max(samples_written - self.capacity, 0),
+                                samples_written))
+
+        offset = start % self.capacity
+        view = self._data[:, offset:offset + stop - start]
+        view.setflags(write=False)
+        return view
+
+
+class Scheduler(object):
+    """
+    Wait for specific points in time with sub-millisecond precision.
+
+    Waiting is performed in two phases: the scheduler first sleeps until
+    shortly before the target time, and then busy-waits (spins) on a
+    high-resolution monotonic clock for the remaining time. This yields
+    precise timing, while the CPU is only kept busy for the duration of the
+    spin window.
+
+    All stimulation apparatuses use a scheduler to wait for the
+    ``trigger_time`` of a stimulus and for the end of a stimulation.
+
+    """
+    def __init__(self, spin_window=None, timebase=None, max_events=10000):
+        """
+        Parameters
+        ----------
+        spin_window : float, optional
+            For how long (in seconds) to busy-wait before the target time.
+            Must exceed by how much sleeping may overshoot on the system.
+            Larger values make the timing more robust against imprecise
+            sleeping, at the cost of a higher CPU load. If ``0``, always
+            sleep; if ``float('inf')``, always spin.
+            Defaults to 20 ms on Windows with Python versions before 3.11,
+            where sleeping has a resolution of about 15.6 ms, and to 2 ms
+            otherwise.
+        timebase : callable, optional
+            A function returning the current time in seconds, e.g.
+            ``psychopy.core.getTime``. All times passed to and returned by
+            the scheduler refer to this timebase. The offset between this
+            timebase and the internal clock is determined once when
+            creating the scheduler; see `calibrate`. If ``None``, use
+            ``timeit.default_timer``, i.e. ``time.perf_counter`` on
+            Python 3.
+        max_events : int, optional
+            The maximum number of events to keep in `events`.
+            Defaults to 10000.
+
+        """
+        if spin_window is None:
+            spin_window = _default_spin_window
+
+        self.spin_window = spin_window
+        self._timebase = timebase
+        self._offset_ns = 0
+        self.events = deque(maxlen=max_events)
+        self.calibrate()
+
+    def calibrate(self):
+        """
+        Determine the offset between the timebase and the internal clock.
+
+        The offset is estimated from the fastest of several consecutive
+        readings of both clocks. Re-calibration may be required if the
+        timebase is adjusted, e.g. if a PsychoPy clock is reset.
+
+        """
+        if self._timebase is None:
+            self._offset_ns = 0
+            return
+
+        best_round_trip = None
+        for _ in range(10):
+            before = _perf_counter_ns()
+            timebase_time = self._timebase()
+            after = _perf_counter_ns()
+
+            round_trip = after - before
+            if (best_round_trip is None) or (round_trip < best_round_trip):
+                best_round_trip = round_trip
+                self._offset_ns = (int(round(timebase_time * 1e9)) -
+                                   (before + after) // 2)
+
+    def get_time(self):
+        """
+        Return the current time, in seconds.
+
+        """
+        return (_perf_counter_ns() + self._offset_ns) / 1e9
+
+    def wait_until(self, t, record=True):
+        """
+        Wait until the specified point in time.
+
+        Parameters
+        ----------
+        t : float or None
+            The time (in seconds) to wait for. If it has already passed,
+            return immediately. If ``None``, do not wait at all.
+        record : bool, optional
+            Whether to append the returned event to `events`.
+            Defaults to ``True``.
+
+        Returns
+        -------
+        ScheduledEvent
+            A namedtuple containing the scheduled time, the actual time at
+            which the wait was over (the onset), and the difference between
+            both (the lateness), all in seconds. If `t` is ``None``, the
+            scheduled time is set to the onset.
+
+        """
+        if t is None:
+            target_ns = onset_ns = _perf_counter_ns()
+        else:
+            target_ns = int(round(t * 1e9)) - self._offset_ns
+            remaining_ns = target_ns - _perf_counter_ns()
+
+            if remaining_ns > self._spin_window_ns:
+                _sleep((remaining_ns - self._spin_window_ns) / 1e9)
+
+            onset_ns = _perf_counter_ns()
+            while onset_ns < target_ns:
+                onset_ns = _perf_counter_ns()
+        event = ScheduledEvent(
+            scheduled=(target_ns + self._offset_ns) / 1e9,
+            onset=(onset_ns + self._offset_ns) / 1e9,
+            lateness=(onset_ns - target_ns) / 1e9
+        )
+
+        if record:
+            self.events.append(event)
+
+        return event
+
+    def record_onset(self, scheduled):
+        """
+        Record an event that occurred just now, e.g. the start of a
+        hardware-timed output that was initiated after `wait_until`.
+
+        Parameters
+        ----------
+        scheduled : float
+            The time (in seconds) at which the event was scheduled.
+
+        Returns
+        -------
+        ScheduledEvent
+            The recorded event, with the current time as its onset.
+
+        """
+        onset_ns = _perf_counter_ns()
+        scheduled_ns = int(round(scheduled * 1e9)) - self._offset_ns
+        event = ScheduledEvent(
+            scheduled=scheduled,
+            onset=(onset_ns + self._offset_ns) / 1e9,
+            lateness=(onset_ns - scheduled_ns) / 1e9
+        )
+        self.events.append(event)
+        return event
+
+    def wait(self, duration):
+        """
+        Wait for the specified duration (in seconds).
+
+        The wait is not recorded in `events`.
+
+        """
+        return self.wait_until(self.get_time() + duration, record=False)
+
+    @property
+    def spin_window(self):
+        """
+        For how long (in seconds) to busy-wait before the target time.
+
+        """
+        return self._spin_window_ns / 1e9
+
+    @spin_window.setter
+    def spin_window(self, spin_window):
+        if spin_window < 0:
+            raise ValueError('spin_window must not be negative.')
+
+        # Infinity cannot be converted to an integer, so cap the window at
+        # an (effectively infinite) 10**9 seconds.
+        self._spin_window_ns = int(round(min(spin_window, 1e9) * 1e9))
 
 
 class _StimulationApparatus(object):
@@ -21,14 +475,35 @@ class _StimulationApparatus(object):
     stimulus : dict
     stimuli : list of dicts
     test_mode : bool
+    scheduler : Scheduler
 
     """
-    def __init__(self, test_mode=False):
+    def __init__(self, test_mode=False, scheduler=None):
         super(_StimulationApparatus, self).__init__()
-        self._stimuli = list()
+        # The stimuli, keyed by their names. This allows for constant-time
+        # lookup when selecting a stimulus.
+        self._stimuli = OrderedDict()
         self._stimulus = None
         self._test_mode = test_mode
 
+        # An exception raised by a stimulation in the worker thread that
+        # has not been reported to the caller yet.
+        self._worker_error = None
+
+        # Hardware-timed output, see _load_waveform().
+        self._hardware_timed = False
+        self._waveform_running = False
+        self._waveform_duration = 0
+
+        # Trigger times are specified in terms of the PsychoPy timebase.
+        # In test mode, we do not want to depend on PsychoPy.
+        if scheduler is None:
+            if test_mode:
+                scheduler = Scheduler()
+            else:
+                scheduler = Scheduler(timebase=_get_psychopy_core().getTime)
+        self._scheduler = scheduler
+
     @staticmethod
     def _create_stimulus_from_kwargs(**kwargs):
         replace = kwargs.pop('replace', False)
@@ -38,8 +513,7 @@ class _StimulationApparatus(object):
         return stimulus, replace
 
     def _stimulus_name_exists(self, name):
-        return any([stimulus['name'] == name for stimulus in
-                    self._stimuli])
+        return name in self._stimuli
 
     def add_stimulus(self, **kwargs):
         """
@@ -67,7 +541,7 @@ class _StimulationApparatus(object):
                                'stimulus, set ``replace=True``.'
                                % stimulus['name'])
 
-        self._stimuli.append(stimulus)
+        self._stimuli[stimulus['name']] = stimulus
 
     def select_stimulus(self, name):
         """
@@ -79,24 +553,15 @@ class _StimulationApparatus(object):
             The unique name of the stimulus to select.
 
         """
-        if not self._stimulus_name_exists(name):
+        # The stimulus is not copied, so selection does not allocate any
+        # memory. The stimulation methods must therefore not modify it.
+        try:
+            self._stimulus = self._stimuli[name]
+        except KeyError:
             raise KeyError('Specified stimulus name ``%s`` does not '
                            'exist. You can add stimuli using '
                            '`add_stimulus()`.' % name)
 
-        # Locate the specified stimulus within the stimulus list and
-        # declare it to be the currently selected stimulus.
-        for stimulus_n, stimulus in enumerate(self._stimuli):
-            if stimulus['name'] == name:
-                # We create an explicit copy of the stimulus, so
-                # that modifications to the currently selected
-                # stimulus are not transferred to self._stimuli.
-                self._stimulus = dict(self._stimuli[stimulus_n])
-                break
-        # Based on http://stackoverflow.com/a/8653568
-        # self._stimulus = (stimulus for stimulus in self._stimuli
-        #                  if stimulus['name'] == name).next()
-
     def remove_stimulus(self, name):
         """
         Remove the specified stimulus, identified by its unique name,
@@ -108,27 +573,164 @@ class _StimulationApparatus(object):
             The unique name of the stimulus to remove.
         
         """
-        if not self._stimulus_name_exists(name):
+        try:
+            del self._stimuli[name]
+        except KeyError:
             raise KeyError('Specified stimulus name ``%s`` does not '
                            'exist. You can add stimuli using '
                            '``_add_stimulus()``.' % name)
 
-        # Search through the stimulus list, looking for a stimulus with
-        # the specified name. If we get a match, remove the stimulus from
-        # the list.
-        for stimulus_n, stimulus in enumerate(self._stimuli):
-            if stimulus['name'] == name:
-                self._stimuli.pop(stimulus_n)
-                break
+    def _start_worker(self):
+        """
+        Start the worker thread executing the stimulations.
+
+        The thread is started right away, so that no thread needs to be
+        created when the first stimulation is requested.
+
+        """
+        self._worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._worker.submit(lambda: None).result()
+
+    def _stop_worker(self):
+        if getattr(self, '_worker', None) is not None:
+            self._worker.shutdown(wait=False)
+            self._worker = None
+
+    def _dispatch_stimulation(self, blocking_wait):
+        """
+        Present the currently selected stimulus, either via the worker
+        thread, or -- if threads are not used -- directly.
+
+        """
+        if not self._stimulus:
+            raise ValueError('No stimulus selected. Please invoke '
+                             '``select_stimulus()`` first.')
+
+        return self._submit(self._stimulate, self._stimulus,
+                            blocking_wait=blocking_wait)
+
+    def _submit(self, function, *args, **kwargs):
+        """
+        Execute `function` via the worker thread, or -- if threads are not
+        used -- directly.
+
+        If a previous non-blocking execution in the worker thread failed,
+        its exception is raised instead.
+
+        """
+        blocking_wait = kwargs.pop('blocking_wait', False)
+
+        if self._worker_error is not None:
+            error = self._worker_error
+            self._worker_error = None
+            raise error
+
+        if not self._use_threads:
+            return function(*args)
+
+        if blocking_wait:
+            # Exceptions are raised by result() right away.
+            future = self._worker.submit(function, *args)
+            future.result()
+        else:
+            future = self._worker.submit(self._run_and_report_errors,
+                                         function, *args)
+        return future
+
+    def _run_and_report_errors(self, function, *args):
+        """
+        Execute `function` in the worker thread. Any exception is reported
+        via a warning right away, and raised again by the next call to
+        `_submit` -- the caller might never inspect the returned future.
+
+        """
+        try:
+            return function(*args)
+        except Exception as e:
+            self._worker_error = e
+            warnings.warn('Stimulation in the worker thread failed: %r. The '
+                          'exception will be raised again by the next '
+                          'stimulation.' % e, RuntimeWarning)
+            raise
+
+    def _duration_to_samples(self, duration):
+        """
+        Convert a duration (in seconds) into a number of samples of the
+        hardware-timed output. At least one sample is returned.
+
+        """
+        return max(int(round(duration * self._sample_rate)), 1)
+
+    def _load_waveform(self, waveform):
+        """
+        Transfer a hardware-timed waveform to the NI board, without
+        starting its generation yet.
+
+        The generation of the previous waveform, if any, is completed
+        first.
+
+        Parameters
+        ----------
+        waveform : ndarray
+            The samples to generate, of shape ``(samples, channels)``.
+
+        """
+        self._finish_waveform()
+        n_samples = waveform.shape[0]
+
+        if not self._ni_task.configure_timing_sample_clock(
+                rate=self._sample_rate,
+                sample_mode='finite',
+                samples_per_channel=n_samples):
+            raise IOError('Could not configure digital output sample clock.')
 
-        # Based on http://stackoverflow.com/a/8653568
-        # (self._stimuli.pop(stimulus_n) for
-        #  stimulus_n, stimulus in enumerate(self._stimuli)
-        #  if stimulus['name'] == name).next()
+        if self._ni_task.write(waveform, auto_start=False,
+                               layout='group_by_scan_number') <= 0:
+            raise IOError('Could not write waveform.')
+
+        self._waveform_duration = n_samples / self._sample_rate
+
+    def _start_waveform(self, trigger_time):
+        """
+        Start the generation of the loaded waveform at `trigger_time`.
+
+        The generation is carried out by the NI board, so this method
+        returns immediately after starting it.
+
+        Returns
+        -------
+        ScheduledEvent
+            The scheduled time, and the time at which the generation was
+            started.
+
+        """
+        wakeup = self._scheduler.wait_until(trigger_time, record=False)
+
+        if not self._ni_task.start():
+            raise IOError('Could not start digital output task.')
+        self._waveform_running = True
+
+        return self._scheduler.record_onset(wakeup.scheduled)
+
+    def _finish_waveform(self):
+        """
+        Wait until the generation of the current waveform, if any, has
+        been completed, and stop the task.
+
+        """
+        if not self._waveform_running:
+            return
+
+        self._ni_task.wait_until_done(timeout=self._waveform_duration + 10)
+        self._ni_task.stop()
+        self._waveform_running = False
 
     def stimulate(self, **kwargs):
         raise NotImplementedError('stimulate() not implemented.')
 
+    def _stimulate(self, stimulus):
+        raise NotImplementedError('_stimulate() not implemented.')
+
     # Declare some properties with getters and setters for convenient
     # access to those properties.
 
@@ -170,16 +772,31 @@ class _StimulationApparatus(object):
         add_stimulus, remove_stimulus
 
         """
-        return self._stimuli
+        return list(self._stimuli.values())
 
     @property
     def test_mode(self):
         return self._test_mode
 
+    @property
+    def scheduler(self):
+        """
+        The scheduler used to time the stimulations.
+
+        Its ``events`` attribute contains the scheduled and actual onset
+        times of all stimulations.
+
+        See Also
+        --------
+        Scheduler
+
+        """
+        return self._scheduler
+
     @stimuli.deleter
     def stimuli(self):
         del self.stimulus
-        self._stimuli = list()
+        self._stimuli = OrderedDict()
 
 
 class Olfactometer(_StimulationApparatus):
@@ -192,7 +809,11 @@ class Olfactometer(_StimulationApparatus):
                  ni_trigger_line=None,
                  ni_task_name='Olfactometer',
                  use_threads=True,
-                 test_mode=False):
+                 test_mode=False,
+                 scheduler=None,
+                 hardware_timed=False,
+                 sample_rate=10000,
+                 ni_trigger_duration=None):
         """
         Parameters
         ----------
@@ -203,25 +824,63 @@ class Olfactometer(_StimulationApparatus):
             A line on which to generate an additional trigger pulse as the
             olfactometer stimulation is initiated. This can be used to
             start the acquisition of PID data, for example.
+        ni_trigger_duration : float or None, optional
+            The duration of the trigger pulse (in seconds) on
+            `ni_trigger_line` if `hardware_timed` is ``True``. If ``None``,
+            the trigger line stays HIGH for the entire stimulus duration.
+            Defaults to ``None``.
         ni_task_name : string, optional
             The name of the NI DAQ task to create.
             Defaults to ``Olfactometer``.
         use_threads : bool, optional
-            Whether a Python thread should be created when
-            `select_stimulus` is called. This thread would then allow
-            non-blocking stimulation.
+            Whether the stimulation should be executed by a worker thread,
+            allowing for non-blocking stimulation. The thread is created
+            once and then reused for all stimulations.
             Defaults to ``True``.
         test_mode : bool, optional
             If ``True``, the NI board will not actually be initialized or used
             in any manner. This allows for testing the program logic on a
             computer without a DAQ card.
             Defaults to ``False``.
+        scheduler : Scheduler, optional
+            The scheduler to use for timing the stimulation. If ``None``,
+            create a new scheduler using the ``psychopy.core.getTime``
+            timebase (or ``timeit.default_timer`` in test mode).
+        hardware_timed : bool, optional
+            If ``True``, the entire stimulation, including the trigger
+            pulse, is compiled into a single waveform when adding a
+            stimulus. This waveform is then clocked out by the NI board at
+            `sample_rate`, yielding pulse durations that do not depend on
+            the operating system's scheduler. See the Notes.
+            Defaults to ``False``.
+        sample_rate : float, optional
+            The sample rate (in Hz) of the hardware-timed output. The
+            durations of all stimuli are rounded to multiples of the sample
+            period.
+            Defaults to 10 kHz.
+
+        Notes
+        -----
+        Hardware-timed output requires lines that support buffered
+        generation; on M and X Series boards, these are the lines of
+        ``port0`` only.
+
+        In hardware-timed mode, the waveform is transferred to the NI board
+        before the trigger time, and its generation is started at the
+        trigger time. ``stimulate`` returns as soon as the generation has
+        started (even if ``blocking_wait=True``), and the returned onset is
+        the time of the start. The generation is completed by the board;
+        a subsequent stimulation waits for it to finish.
 
         """
-        super(Olfactometer, self).__init__(test_mode=test_mode)
+        super(Olfactometer, self).__init__(test_mode=test_mode,
+                                           scheduler=scheduler)
+        self._hardware_timed = hardware_timed
+        self._sample_rate = sample_rate
+        self._ni_trigger_duration = ni_trigger_duration
 
         if not self.test_mode:
-            self._ni_task = nidaqmx.DigitalOutputTask(name=ni_task_name)
+            self._ni_task = _get_nidaqmx().DigitalOutputTask(name=ni_task_name)
 
             # Add the stimulation channels.
             if not self._ni_task.create_channel(ni_lines):
@@ -245,16 +904,24 @@ class Olfactometer(_StimulationApparatus):
                     self._ni_task.get_number_of_channels() - \
                     self._ni_task_number_of_channels
 
-            if not self._ni_task.start():
+            # In hardware-timed mode, the task is started for every
+            # stimulation, after its sample clock has been configured.
+            if not self._hardware_timed and not self._ni_task.start():
                 raise IOError('Could not start digital output task.')
         else:
             self._ni_task_number_of_channels = 8
             self._ni_task_number_of_trigger_channels = 1
+            self._ni_task = _SimulatedDigitalOutputTask(
+                name=ni_task_name, number_of_channels=9)
 
         self._use_threads = use_threads
-        self._thread = None
+        self._worker = None
+        if self._use_threads:
+            self._start_worker()
 
     def __del__(self):
+        self._stop_worker()
+        self._finish_waveform()
         if not self.test_mode:
             self._ni_task.clear()
         del self
@@ -315,12 +982,58 @@ class Olfactometer(_StimulationApparatus):
             if bitmask_offset.shape[0] != self._ni_task_number_of_channels:
                 raise ValueError('Please specify a valid bitmask_offset.')
 
+        # The bitmasks to write to the NI board, including the trigger
+        # channel, if any. They are created here, so nothing needs to be
+        # allocated when selecting or presenting the stimulus.
+        trigger_onset = np.ones(self._ni_task_number_of_trigger_channels,
+                                dtype=np.uint8)
+        trigger_offset = np.zeros(self._ni_task_number_of_trigger_channels,
+                                  dtype=np.uint8)
+        ni_bitmask = np.r_[bitmask, trigger_onset]
+        ni_bitmask_offset = np.r_[bitmask_offset, trigger_offset]
+
+        if self._hardware_timed:
+            ni_waveform = self._build_waveform(ni_bitmask, ni_bitmask_offset,
+                                               duration)
+        else:
+            ni_waveform = None
+
+        # The stimulus is not copied on selection, so protect the bitmasks
+        # from modification.
+        for array in (bitmask, bitmask_offset, ni_bitmask, ni_bitmask_offset,
+                      ni_waveform):
+            if array is not None:
+                array.setflags(write=False)
+
         super(Olfactometer, self).add_stimulus(
             name=name, bitmask=bitmask, bitmask_offset=bitmask_offset,
             duration=duration, trigger_time=trigger_time,
-            replace=replace, **kwargs
+            _ni_bitmask=ni_bitmask, _ni_bitmask_offset=ni_bitmask_offset,
+            _ni_waveform=ni_waveform, replace=replace, **kwargs
         )
 
+    def _build_waveform(self, ni_bitmask, ni_bitmask_offset, duration):
+        """
+        Compile the onset and offset bitmasks into a waveform of shape
+        ``(samples, channels)``. The last sample holds the offset bitmask.
+
+        """
+        n_onset = self._duration_to_samples(duration)
+        waveform = np.empty((n_onset + 1, ni_bitmask.shape[0]),
+                            dtype=np.uint8)
+        waveform[:n_onset] = ni_bitmask
+        waveform[n_onset] = ni_bitmask_offset
+
+        if (self._ni_task_number_of_trigger_channels and
+                self._ni_trigger_duration is not None):
+            n_trigger = min(
+                self._duration_to_samples(self._ni_trigger_duration), n_onset
+            )
+            waveform[n_trigger:n_onset,
+                     self._ni_task_number_of_channels:] = 0
+
+        return waveform
+
     def select_stimulus(self, name):
         """
         Select the specified stimulus for the next stimulation.
@@ -333,185 +1046,902 @@ class Olfactometer(_StimulationApparatus):
         """
         super(Olfactometer, self).select_stimulus(name)
 
-        # Add trigger channel if necessary.
+    def stimulate(self, blocking_wait=False):
+        """
+        Start the stimulation with the currently selected stimulus.
+
+        The trigger pulse will open the valves. They are then left open for
+        the intended duration of the stimulus. After that, they will be
+        switched to the offset state specified by the stimulus.
+
+        Parameters
+        ----------
+        blocking_wait : bool, optional
+            Specifies whether we should wait for the stimulation thread to
+            finish the stimulation (blocking other operations), or return
+            immediately. This parameter will be ignored if threads are not
+            used for stimulation.
+            Defaults to `False`, i.e. non-blocking behavior.
+
+        Returns
+        -------
+        ScheduledEvent or Future
+            The scheduled and actual onset time of the stimulation. If
+            threads are used, a `concurrent.futures.Future` is returned
+            instead, which resolves to the onset time once the stimulation
+            has finished.
+
+        See Also
+        --------
+        add_stimulus
+        select_stimulus
+
+        Notes
+        -----
+        The stimulus remains selected after the stimulation, so
+        ``stimulate`` can be called repeatedly to present the same stimulus
+        again. If threads are used, all stimulations are executed one after
+        the other by a single, long-lived worker thread; stimulations
+        requested while another stimulation is still running are queued.
+        If a non-blocking stimulation fails, a warning is issued, and the
+        exception is raised again by the next call to ``stimulate``.
+
+        """
+        return self._dispatch_stimulation(blocking_wait)
+
+    def _stimulate(self, stimulus):
+        stimulus_duration = stimulus['duration']
+        bitmask = stimulus['_ni_bitmask']
+        bitmask_offset = stimulus['_ni_bitmask_offset']
+
+        # Set up the DAQ before the trigger time, so that the trigger time
+        # does not include any setup latency.
+        if self._hardware_timed:
+            self._load_waveform(stimulus['_ni_waveform'])
+            return self._start_waveform(stimulus['trigger_time'])
+
+        onset = self._scheduler.wait_until(stimulus['trigger_time'])
+
+        if self._ni_task.write(bitmask) <= 0:
+            raise IOError('Could not write onset bitmask.')
+
+        self._scheduler.wait(stimulus_duration)
+
+        if self._ni_task.write(bitmask_offset) <= 0:
+            raise IOError('Could not write offset bitmask.')
+
+        return onset
+
+
+class DataRecorder(object):
+    """
+    Write chunks of acquired data to disk from a background thread.
+
+    The samples are appended to a raw binary file, ``<filename>.dat``, in
+    an array of shape ``(samples, channels)``. A metadata file,
+    ``<filename>.json``, describes the data type, number of channels, and
+    sampling rate. It is written when the recording is started, and
+    updated with the total number of samples when the recorder is closed.
+    Every chunk is described by one line of ``<filename>.chunks.jsonl``,
+    which is appended as soon as the chunk has been written, so that it
+    survives a crash and does not accumulate in memory. Use
+    `load_recording` to read the data.
+
+    Chunks are handed to the writer thread via a bounded queue. Queuing a
+    chunk never blocks: if the queue is full because the disk cannot keep
+    up, the chunk is dropped, and a warning is issued.
+
+    """
+    def __init__(self, filename, n_channels, sampling_rate,
+                 dtype=np.float64, max_queue_size=64, **metadata):
+        """
+        Parameters
+        ----------
+        filename : str
+            The path of the files to create, without extension.
+        n_channels : int
+            The number of channels of the data.
+        sampling_rate : float
+            The sampling rate (in Hz) of the data.
+        dtype : numpy.dtype, optional
+            The data type to store the data as.
+            Defaults to ``float64``.
+        max_queue_size : int, optional
+            The maximum number of chunks waiting to be written.
+            Defaults to 64.
+
+        Notes
+        -----
+        Any additional keyword arguments will be stored in the metadata
+        file.
+
+        """
+        self._data_filename = filename + '.dat'
+        self._metadata_filename = filename + '.json'
+        self._chunks_filename = filename + '.chunks.jsonl'
+        self._n_channels = n_channels
+        self._dtype = np.dtype(dtype)
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._dropped_chunks = 0
+        self._samples_written = 0
+        self._closed = False
+        self._error = None
+
+        self._metadata = dict(metadata)
+        self._metadata.update(dtype=self._dtype.str, n_channels=n_channels,
+                              sampling_rate=sampling_rate,
+                              start_time=time.time(), n_samples=0,
+                              dropped_chunks=0)
+
+        self._file = open(self._data_filename, 'wb')
+        self._chunks_file = open(self._chunks_filename, 'w')
+        self._write_metadata()
+
+        self._writer = threading.Thread(target=self._write_chunks,
+                                        name='DataRecorder')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def write(self, chunk, channels_first=False, **metadata):
+        """
+        Queue a chunk of data for writing, without blocking.
+
+        Parameters
+        ----------
+        chunk : ndarray
+            The data, of shape ``(samples, channels)``. A one-dimensional
+            array is considered to be a single channel. The array must not
+            be modified after it has been queued.
+        channels_first : bool, optional
+            Whether `chunk` is of shape ``(channels, samples)`` instead.
+            Defaults to ``False``.
+
+        Returns
+        -------
+        bool
+            ``True`` if the chunk was queued, and ``False`` if it was
+            dropped because the queue was full.
+
+        Notes
+        -----
+        Any additional keyword arguments, e.g. a trial number, will be
+        stored along with the chunk in the chunk metadata file.
+
+        """
+        if self._closed:
+            raise RuntimeError('The recorder has already been closed.')
+
+        n_channels = 1 if chunk.ndim == 1 else chunk.shape[
+            0 if channels_first else 1]
+        if n_channels != self._n_channels:
+            raise ValueError('Expected a chunk of %d channels, but got %d.'
+                             % (self._n_channels, n_channels))
+
+        try:
+            self._queue.put_nowait((chunk, channels_first, metadata))
+        except queue.Full:
+            self._dropped_chunks += 1
+            warnings.warn('The write queue is full, and a chunk of data was '
+                          'dropped (%d chunks dropped so far). Consider '
+                          'increasing max_queue_size.' % self._dropped_chunks,
+                          RuntimeWarning)
+            return False
+
+        return True
+
+    def _write_chunks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            chunk, channels_first, metadata = item
+            if chunk.ndim == 1:
+                chunk = chunk[:, np.newaxis]
+            elif channels_first:
+                chunk = chunk.T
+
+            # After an error, keep emptying the queue, so that no chunks
+            # will be dropped because of it; the error is raised on close().
+            if self._error is not None:
+                continue
+
+            metadata.update(first_sample=self._samples_written,
+                            n_samples=chunk.shape[0])
+
+            try:
+                self._write_data(chunk)
+                self._file.flush()
+                self._chunks_file.write(
+                    json.dumps(metadata, default=_to_json) + '\n')
+                self._chunks_file.flush()
+            except Exception as e:
+                self._error = e
+                continue
+
+            self._samples_written += chunk.shape[0]
+
+    def _write_data(self, chunk):
+        # tofile() writes non-contiguous arrays, e.g. transposed chunks,
+        # element by element, which is slow; so copy them into C order.
+        np.ascontiguousarray(chunk, dtype=self._dtype).tofile(self._file)
+
+    def _write_metadata(self):
+        with open(self._metadata_filename, 'w') as f:
+            json.dump(self._metadata, f, indent=2, default=_to_json)
+
+    def close(self):
+        """
+        Write all queued chunks, and close the files.
+
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self._file.close()
+        self._chunks_file.close()
+
+        self._metadata.update(n_samples=self._samples_written,
+                              dropped_chunks=self._dropped_chunks)
+        self._write_metadata()
+
+        if self._error is not None:
+            raise IOError('Could not write data to %s: %s'
+                          % (self._data_filename, self._error))
+
+    @property
+    def dropped_chunks(self):
+        """
+        The number of chunks dropped because the queue was full.
+
+        """
+        return self._dropped_chunks
+
+    @property
+    def queued_chunks(self):
+        """
+        The number of chunks currently waiting to be written.
+
+        """
+        return self._queue.qsize()
+
+
+def _to_json(o):
+    if isinstance(o, (np.generic, np.ndarray)):
+        return o.tolist()
+    raise TypeError('%r is not JSON serializable.' % o)
+
+
+Recording = namedtuple('Recording', 'data metadata')
+
+
+def load_recording(filename):
+    """
+    Load data written by a `DataRecorder`.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the recording, without extension.
+
+    Returns
+    -------
+    Recording
+        A namedtuple containing a read-only memory map of the data of shape
+        ``(samples, channels)``, and the metadata. The metadata of the
+        individual chunks is stored as a list under the ``chunks`` key.
+
+    Notes
+    -----
+    The number of samples is determined from the size of the data file,
+    so recordings that have not been closed properly can be loaded, too.
+
+    """
+    with open(filename + '.json') as f:
+        metadata = json.load(f)
+
+    # The last line may be incomplete if the recorder was not closed.
+    with open(filename + '.chunks.jsonl') as f:
+        metadata['chunks'] = [json.loads(line) for line in f
+                              if line.endswith('\n')]
+
+    dtype = np.dtype(str(metadata['dtype']))
+    n_channels = metadata['n_channels']
+    n_samples = (os.path.getsize(filename + '.dat') //
+                 (dtype.itemsize * n_channels))
+
+    # Empty files cannot be memory-mapped.
+    if n_samples == 0:
+        data = np.empty((0, n_channels), dtype=dtype)
+    else:
+        data = np.memmap(filename + '.dat', dtype=dtype, mode='r',
+                         shape=(n_samples, n_channels))
+
+    return Recording(data=data, metadata=metadata)
+
+
+class AnalogInput(object):
+    """
+    Analog data acquisition using a National Instruments board.
+
+    """
+    def __init__(self, ni_input_line='Dev1/ai0',
+                 ni_trigger_line=None,
+                 sampling_duration=3,
+                 sampling_rate=2000,
+                 ni_task_name='AnalogInput',
+                 test_mode=False,
+                 scale=1,
+                 offset=0):
+
+        """
+        Parameters
+        ----------
+        ni_input_line : str or list of str, optional
+            The analog input line(s) to acquire the data from, e.g.
+            `Dev1/ai0`, `Dev1/ai0:2`, or ``['Dev1/ai0', 'Dev1/ai4']``. All
+            lines are sampled synchronously within a single task.
+            Defaults to `Dev1/ai0`.
+        ni_trigger_line : str, optional
+            If specified, start the acquisition only after a start trigger
+            (high voltage) on this line has been received.
+            If `None`, no external trigger is required.
+        sampling_duration : float, optional
+            How long to sample, specified in seconds.
+            Defaults to 3 seconds.
+        sampling_rate : int, optional
+            At which rate (in Hz) to sample the analog input signal.
+            Defaults to 2000 Hz.
+        ni_task_name : str, optional
+            The name of the NIDAQmx task to create.
+            Defaults to `AnalogInput`.
+        test_mode : bool, optional
+            If ``True``, the NI board will not actually be initialized or used
+            in any manner. Instead, a simulated task generating a ramp
+            signal in real time is used. This allows for testing the
+            program logic on a computer without a DAQ card.
+            Defaults to ``False``.
+        scale, offset : float or array_like, optional
+            Convert the acquired voltages into physical units by
+            multiplying them with `scale` and adding `offset`. Specify one
+            value per channel to scale the channels differently.
+            Default to 1 and 0, i.e., no scaling.
+
+        """
+        self._test_mode = test_mode
+        self._sampling_duration = sampling_duration
+        self._sampling_rate = sampling_rate
+        self._samples_to_acquire = int(np.floor(self._sampling_rate * \
+                                                self._sampling_duration))
+
+        # Asynchronous finite acquisition.
+        self._worker = None
+
+        # Recording to disk. The lock prevents the recorder from being
+        # closed while the continuous reader thread or the worker thread of
+        # get_data_async() is handing data to it.
+        self._recorder = None
+        self._recorder_lock = threading.Lock()
+        self._trials_recorded = 0
+
+        # Continuous acquisition.
+        self._ring_buffer = None
+        self._reader = None
+        self._reader_error = None
+        self._stop_reading = threading.Event()
+
+        if not self.test_mode:
+            self._ni_task = _get_nidaqmx().AnalogInputTask(name=ni_task_name)
+        else:
+            self._ni_task = _SimulatedAnalogInputTask(name=ni_task_name)
+
+        if isinstance(ni_input_line, (list, tuple)):
+            ni_input_lines = ni_input_line
+        else:
+            ni_input_lines = [ni_input_line]
+
+        for line in ni_input_lines:
+            if not self._ni_task.create_voltage_channel(
+                    line, min_val=-10, max_val=10):
+                raise IOError('Could not create analog input channel.')
+
+        if not self._ni_task.configure_timing_sample_clock(
+                rate=self._sampling_rate,
+                sample_mode='finite',
+                samples_per_channel=self._samples_to_acquire):
+            raise IOError('Could not configure analog input sample clock.')
+
+        self._ni_task_number_of_channels = \
+            self._ni_task.get_number_of_channels()
+
+        # The scaling is applied in-place to freshly read data, and
+        # skipped entirely if it would not change anything.
+        self._scale = np.array(np.broadcast_to(
+            np.asarray(scale, dtype=np.float64),
+            (self._ni_task_number_of_channels,)))
+        self._offset = np.array(np.broadcast_to(
+            np.asarray(offset, dtype=np.float64),
+            (self._ni_task_number_of_channels,)))
+        for array in (self._scale, self._offset):
+            array.setflags(write=False)
+        self._apply_scaling = ((self._scale != 1).any() or
+                               (self._offset != 0).any())
+
+        if ni_trigger_line is None:
+            self._ni_task_number_of_trigger_channels = 0
+        else:
+            if not self._ni_task.configure_trigger_digital_edge_start(
+                    ni_trigger_line):
+                raise IOError('Could not configure trigger channel.')
+
+            self._ni_task_number_of_trigger_channels = 1
+
+            # Data acquisition is set to be triggered by an external
+            # trigger. Thus we can start the task immediately.
+            if not self._ni_task.start():
+                raise IOError('Could not start analog input task.')
+
+    def __del__(self):
+        if self._worker is not None:
+            self._worker.shutdown(wait=False)
+        if self.continuous:
+            self.stop_continuous()
+        if self._recorder is not None:
+            self.stop_recording()
+        if not self.test_mode:
+            self._ni_task.clear()
+        del self
+
+    def get_data(self, out=None, channels_first=False):
+        """
+        Return the acquired data.
+
+        If the acquisition is not finished by the time this method is
+        called, it will first wait until finished (blocking other
+        processing) and then return the data.
+
+        Parameters
+        ----------
+        out : ndarray, optional
+            A preallocated array to store the data in, e.g. one row of an
+            array holding the data of all trials of a session. Must be of
+            the shape of the returned data, or of shape
+            ``(samples_to_acquire,)`` if only one channel is acquired.
+        channels_first : bool, optional
+            If ``True``, return the data of every channel contiguously, in
+            an array of shape ``(channels, samples_to_acquire)``. The
+            samples are then demultiplexed by the NI driver while reading.
+            Defaults to ``False``.
+
+        Returns
+        -------
+        ndarray
+            The acquired data, of shape ``(samples_to_acquire, channels)``
+            or ``(channels, samples_to_acquire)``, depending on
+            `channels_first`. If `out` was specified, `out` is returned.
+
+        Examples
+        --------
+        Collect the data of an entire session in one contiguous array:
+
+        >>> ai = AnalogInput(ni_trigger_line='Dev1/PFI0')
+        >>> data = np.empty((n_trials, ai.samples_to_acquire))
+        >>> for trial in range(n_trials):
+        ...     # Present the stimulus, which triggers the acquisition.
+        ...     ai.get_data(out=data[trial])
+
+        """
+        if self.continuous:
+            raise RuntimeError('get_data() is not available during '
+                               'continuous acquisition. Please use '
+                               'get_latest() or get_window() instead.')
+
+        if out is not None:
+            self._check_out(out, channels_first)
+
+        # If we do not use an external trigger, start the data
+        # acquisition immediately. The onset of an external trigger is
+        # unknown to us.
+        if self._ni_task_number_of_trigger_channels == 0:
+            trigger_time = time.time()
+            self._ni_task.start()
+        else:
+            trigger_time = None
+
+        self._ni_task.wait_until_done()
+        if channels_first:
+            read = self._ni_task.read(timeout=-1,
+                                      fill_mode='group_by_channel')
+            self._scale_data(read, channel_axis=0)
+        else:
+            read = self._ni_task.read(timeout=-1)
+            self._scale_data(read, channel_axis=1)
+        self._ni_task.stop()
+
+        # get_data_async() calls this from a worker thread, so the recorder
+        # might be stopped concurrently.
+        with self._recorder_lock:
+            recorder = self._recorder
+            if recorder is not None:
+                # If `read` is returned, the caller might modify it.
+                recorder.write(read if out is not None else read.copy(),
+                               channels_first=channels_first,
+                               trial=self._trials_recorded,
+                               trigger_time=trigger_time)
+                self._trials_recorded += 1
+
+        # If we use an external trigger, we need to re-start the task, or
+        # else the next acquisition won't work because the task would be
+        # still stopped.
+        if self._ni_task_number_of_trigger_channels > 0:
+            self._ni_task.start()
+
+        if out is None:
+            return read
+
+        # Reshaping `read` never copies, while reshaping `out` might, e.g.
+        # for a non-contiguous slice of a session array.
+        out[...] = read.reshape(out.shape)
+        return out
+
+    trigger = get_data
+
+    def _check_out(self, out, channels_first):
+        shape = (self._samples_to_acquire, self._ni_task_number_of_channels)
+        if channels_first:
+            shape = shape[::-1]
+
+        if out.shape != shape and not (
+                self._ni_task_number_of_channels == 1 and
+                out.shape == (self._samples_to_acquire,)):
+            raise ValueError('out must be of shape %s, but is of shape %s.'
+                             % (shape, out.shape))
+
+    def _scale_data(self, data, channel_axis):
+        """
+        Apply the scaling to the channels of `data` in-place.
+
+        """
+        if not self._apply_scaling:
+            return
+
+        if channel_axis == 0:
+            data *= self._scale[:, np.newaxis]
+            data += self._offset[:, np.newaxis]
+        else:
+            data *= self._scale
+            data += self._offset
+
+    def get_data_async(self, out=None, channels_first=False):
+        """
+        Acquire and return the data without blocking.
+
+        The acquisition is carried out by a worker thread. If an external
+        trigger line was specified, the task is re-armed after every
+        acquisition, so the next trial can be acquired right away.
+
+        Parameters
+        ----------
+        out : ndarray, optional
+            A preallocated array to store the data in; see `get_data`.
+        channels_first : bool, optional
+            Whether to return the data in an array of shape
+            ``(channels, samples_to_acquire)``; see `get_data`.
+
+        Returns
+        -------
+        Future
+            A `concurrent.futures.Future` that resolves to the acquired
+            data, as returned by `get_data`.
+
+        Notes
+        -----
+        Acquisitions requested while another acquisition is still running
+        are queued, so calling this method once per trial yields the data
+        of consecutive trials. Do not call `get_data` while an
+        asynchronous acquisition is pending.
+
+        To await the data in a coroutine, wrap the future via
+        ``asyncio.wrap_future``.
+
+        """
+        if self.continuous:
+            raise RuntimeError('get_data_async() is not available during '
+                               'continuous acquisition. Please use '
+                               'get_latest() or get_window() instead.')
+
+        # The worker thread is only created once it is actually needed.
+        if self._worker is None:
+            self._worker = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1)
+
+        # Fail early, and not only once the future is resolved.
+        if out is not None:
+            self._check_out(out, channels_first)
+
+        return self._worker.submit(self.get_data, out=out,
+                                   channels_first=channels_first)
+
+    def start_continuous(self, buffer_duration=60, chunk_duration=0.1):
+        """
+        Start continuous data acquisition.
+
+        The data is read from the NI board in chunks by a background
+        thread, and stored in a ring buffer. The most recent samples can
+        be retrieved at any time, without copying, via `get_latest` and
+        `get_window`. If an external trigger line was specified, the
+        acquisition starts once the trigger has been received.
+
+        Parameters
+        ----------
+        buffer_duration : float, optional
+            How many seconds of data to keep in the ring buffer.
+            Defaults to 60 seconds.
+        chunk_duration : float, optional
+            The duration (in seconds) of the chunks to read from the NI
+            board. Shorter chunks make new data available sooner, at the
+            cost of more frequent reads.
+            Defaults to 100 ms.
+
+        See Also
+        --------
+        stop_continuous, get_latest, get_window
+
+        """
+        if self.continuous:
+            raise RuntimeError('Continuous acquisition is already running.')
+
+        capacity = int(np.ceil(buffer_duration * self._sampling_rate))
+        self._chunk_size = max(int(round(chunk_duration *
+                                         self._sampling_rate)), 1)
+        if self._chunk_size > capacity:
+            raise ValueError('chunk_duration must not exceed '
+                             'buffer_duration.')
+
+        self._ni_task.stop()
+        if not self._ni_task.configure_timing_sample_clock(
+                rate=self._sampling_rate,
+                sample_mode='continuous',
+                samples_per_channel=capacity):
+            raise IOError('Could not configure analog input sample clock.')
+
+        self._ring_buffer = _RingBuffer(self._ni_task_number_of_channels,
+                                        capacity)
+        self._reader_error = None
+        self._stop_reading.clear()
+
+        if not self._ni_task.start():
+            raise IOError('Could not start analog input task.')
+
+        self._reader = threading.Thread(target=self._read_continuously,
+                                        name='AnalogInputReader')
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_continuously(self):
+        # The timeout must allow for waiting for an external trigger. When
+        # stopping the acquisition, the task is stopped first, aborting any
+        # pending read.
+        try:
+            while not self._stop_reading.is_set():
+                chunk = self._ni_task.read(
+                    samples_per_channel=self._chunk_size,
+                    timeout=-1,
+                    fill_mode='group_by_channel'
+                )
+                self._scale_data(chunk, channel_axis=0)
+                first_sample = self._ring_buffer.samples_written
+                self._ring_buffer.write(chunk)
+
+                with self._recorder_lock:
+                    if self._recorder is not None:
+                        self._recorder.write(chunk, channels_first=True,
+                                             acquisition_sample=first_sample)
+        except Exception as e:
+            if not self._stop_reading.is_set():
+                self._reader_error = e
+
+    def stop_continuous(self):
+        """
+        Stop continuous data acquisition, and return to finite acquisition
+        via `get_data`.
+
+        The ring buffer is kept, so the data acquired last can still be
+        retrieved.
+
+        """
+        if not self.continuous:
+            raise RuntimeError('Continuous acquisition is not running.')
+
+        self._stop_reading.set()
+        self._ni_task.stop()
+        self._reader.join()
+        self._reader = None
+
+        self._ni_task.configure_timing_sample_clock(
+            rate=self._sampling_rate,
+            sample_mode='finite',
+            samples_per_channel=self._samples_to_acquire
+        )
         if self._ni_task_number_of_trigger_channels > 0:
-            self._stimulus['bitmask'] = \
-                np.r_[self._stimulus['bitmask'],
-                      np.repeat(1,
-                                self._ni_task_number_of_trigger_channels)]
-            self._stimulus['bitmask_offset'] = \
-                np.r_[self._stimulus['bitmask_offset'],
-                      np.repeat(0,
-                                self._ni_task_number_of_trigger_channels)]
+            self._ni_task.start()
 
-        if self._use_threads:
-            self._thread = threading.Thread(target=self._stimulate)
+    def _get_ring_buffer(self):
+        if self._reader_error is not None:
+            raise IOError('Continuous acquisition failed: %s'
+                          % self._reader_error)
+        if self._ring_buffer is None:
+            raise RuntimeError('No continuous acquisition has been started. '
+                               'Please invoke start_continuous() first.')
+        return self._ring_buffer
 
-    def stimulate(self, blocking_wait=False):
+    def get_latest(self, n_samples):
         """
-        Start the stimulation with the currently selected stimulus.
-
-        The trigger pulse will open the valves. They are then left open for
-        the intended duration of the stimulus. After that, they will be
-        switched to the offset state specified by the stimulus.
+        Return the most recently acquired samples of continuous
+        acquisition.
 
         Parameters
         ----------
-        blocking_wait : bool, optional
-            Specifies whether the stimulation thread should be `joined` or
-            not, i.e. whether we should wait for it to finish (blocking
-            other operations), or return immediately. This parameter will
-            be ignored if threads are not used for stimulation.
-            Defaults to `False`, i.e. non-blocking behavior.
+        n_samples : int
+            The number of samples to return. Must not exceed the number of
+            samples acquired so far, nor the capacity of the ring buffer.
 
-        See Also
-        --------
-        add_stimulus
-        select_stimulus
+        Returns
+        -------
+        ndarray
+            A read-only view of shape ``(channels, n_samples)`` into the
+            ring buffer.
 
         Notes
         -----
-        ``stimulate`` invokes ``_stimulate``, which itself unsets the
-        currently selected stimulus at the end of the stimulation. You have
-        to invoke ``select_stimulus`` again before you can call
-        ``stimulate`` again.
+        The returned array is not a copy, and its oldest samples will be
+        overwritten as soon as the ring buffer wraps around to them, i.e.
+        after about ``buffer_duration - n_samples / sampling_rate`` seconds.
+        If `n_samples` equals the capacity of the ring buffer, this happens
+        when the next chunk is read. Copy the array if you need to keep the
+        data for longer.
 
         """
-        if not self._stimulus:
-            raise ValueError('No stimulus selected. Please invoke '
-                             '``select_stimulus()`` first.')
-
-        if self._use_threads:
-            self._thread.start()
-            if blocking_wait:
-                self._thread.join()
-        else:
-            self._stimulate()
-
-    def _stimulate(self):
-        stimulus_duration = self._stimulus['duration']
-        bitmask = self._stimulus['bitmask']
-        bitmask_offset = self._stimulus['bitmask_offset']
-        trigger_time = self._stimulus['trigger_time']
-
-        if trigger_time is not None:
-            if psychopy.core.getTime() < trigger_time:
-                psychopy.core.wait(
-                    trigger_time - psychopy.core.getTime(),
-                    hogCPUperiod=(trigger_time - psychopy.core.getTime()) / 5
-                )
+        ring_buffer = self._get_ring_buffer()
+        samples_written = ring_buffer.samples_written
+        return ring_buffer.get(samples_written - n_samples, samples_written,
+                               samples_written=samples_written)
 
-        if not self.test_mode:
-            if self._ni_task.write(bitmask) <= 0:
-                raise IOError('Could not write onset bitmask.')
+    def get_window(self, start, stop):
+        """
+        Return the samples of continuous acquisition acquired within a
+        specific time window.
 
-        psychopy.core.wait(stimulus_duration,
-                           hogCPUperiod=stimulus_duration/5)
+        Parameters
+        ----------
+        start, stop : float
+            The beginning and the end of the time window, in seconds since
+            the first sample of the continuous acquisition.
 
-        if not self.test_mode:
-            if self._ni_task.write(bitmask_offset) <= 0:
-                raise IOError('Could not write offset bitmask.')
+        Returns
+        -------
+        ndarray
+            A read-only view of shape ``(channels, samples)`` into the ring
+            buffer.
 
-        self._stimulus = None
+        Notes
+        -----
+        The returned array is not a copy; see `get_latest`.
 
+        """
+        ring_buffer = self._get_ring_buffer()
+        return ring_buffer.get(int(round(start * self._sampling_rate)),
+                               int(round(stop * self._sampling_rate)))
 
-class AnalogInput(object):
-    """
-    Analog data acquisition using a National Instruments board.
+    def start_recording(self, filename, max_queue_size=64, **metadata):
+        """
+        Start writing all acquired data to disk.
 
-    """
-    def __init__(self, ni_input_line='Dev1/ai0',
-                 ni_trigger_line=None,
-                 sampling_duration=3,
-                 sampling_rate=2000,
-                 ni_task_name='AnalogInput'):
+        The data of every trial acquired via `get_data` or
+        `get_data_async`, and every chunk of continuous acquisition, is
+        handed to a `DataRecorder`, which writes it from a background
+        thread without ever blocking the acquisition.
 
-        """
         Parameters
         ----------
-        ni_input_line : str, optional
-            The analog input line to acquire the data from.
-            Defaults to `Dev1/ai0`.
-        ni_trigger_line : str, optional
-            If specified, start the acquisition only after a start trigger
-            (high voltage) on this line has been received.
-            If `None`, no external trigger is required.
-        sampling_duration : float, optional
-            How long to sample, specified in seconds.
-            Defaults to 3 seconds.
-        sampling_rate : int, optional
-            At which rate (in Hz) to sample the analog input signal.
-            Defaults to 2000 Hz.
-        ni_task_name : str, optional
-            The name of the NIDAQmx task to create.
-            Defaults to `AnalogInput`.
+        filename : str
+            The path of the files to create, without extension. The data
+            will be written to ``<filename>.dat``, the metadata to
+            ``<filename>.json``, and the metadata of every trial or chunk
+            to ``<filename>.chunks.jsonl``.
+        max_queue_size : int, optional
+            The maximum number of trials or chunks waiting to be written.
+            If the disk cannot keep up, further data will be dropped, and
+            a warning will be issued.
+            Defaults to 64.
+
+        Notes
+        -----
+        Any additional keyword arguments will be stored in the metadata
+        file. For every trial, the trial number and the trigger time are
+        stored in the chunk metadata file; for every chunk of continuous
+        acquisition, the index of its first sample. The trigger time is the
+        time (as returned by ``time.time``) at which the acquisition was
+        started by `get_data`, or ``None`` if an external trigger is used,
+        as its onset cannot be measured.
+
+        See Also
+        --------
+        stop_recording, load_recording
 
         """
-        self._sampling_duration = sampling_duration
-        self._sampling_rate = sampling_rate
-        self._samples_to_acquire = int(np.floor(self._sampling_rate * \
-                                                self._sampling_duration))
+        if self._recorder is not None:
+            raise RuntimeError('Recording is already running.')
 
-        self._ni_task = nidaqmx.AnalogInputTask(name=ni_task_name)
-        if not self._ni_task.create_voltage_channel(
-                ni_input_line, min_val=-10, max_val=10):
-            raise IOError('Could not create analog input channel.')
+        self._trials_recorded = 0
+        self._recorder = DataRecorder(
+            filename, n_channels=self._ni_task_number_of_channels,
+            sampling_rate=self._sampling_rate,
+            max_queue_size=max_queue_size, **metadata
+        )
 
-        if not self._ni_task.configure_timing_sample_clock(
-                rate=self._sampling_rate,
-                sample_mode='finite',
-                samples_per_channel=self._samples_to_acquire):
-            raise IOError('Could not configure analog input sample clock.')
+    def stop_recording(self):
+        """
+        Stop writing the acquired data to disk, and wait until all queued
+        data has been written.
 
-        self._ni_task_number_of_channels = \
-            self._ni_task.get_number_of_channels()
+        Returns
+        -------
+        int
+            The number of trials or chunks that were dropped.
 
-        if ni_trigger_line is None:
-            self._ni_task_number_of_trigger_channels = 0
-        else:
-            if not self._ni_task.configure_trigger_digital_edge_start(
-                    ni_trigger_line):
-                raise IOError('Could not configure trigger channel.')
+        """
+        if self._recorder is None:
+            raise RuntimeError('Recording is not running.')
 
-            self._ni_task_number_of_trigger_channels = 1
+        with self._recorder_lock:
+            recorder = self._recorder
+            self._recorder = None
 
-            # Data acquisition is set to be triggered by an external
-            # trigger. Thus we can start the task immediately.
-            if not self._ni_task.start():
-                raise IOError('Could not start analog input task.')
+        recorder.close()
+        return recorder.dropped_chunks
 
-    def __del__(self):
-        if not self.test_mode:
-            self._ni_task.clear()
-        del self
+    @property
+    def recorder(self):
+        """
+        The `DataRecorder` writing the data to disk, or ``None``.
 
-    def get_data(self):
         """
-        Return the acquired data.
+        return self._recorder
 
-        If the acquisition is not finished by the time this method is
-        called, it will first wait until finished (blocking other
-        processing) and then return the data.
+    @property
+    def continuous(self):
+        """
+        Whether continuous acquisition is running.
 
         """
-        # If we do not use an external trigger, start the data
-        # acquisition immediately.
-        if self._ni_task_number_of_trigger_channels == 0:
-            self._ni_task.start()
+        return self._reader is not None
 
-        self._ni_task.wait_until_done()
-        read = self._ni_task.read(timeout=-1)
-        self._ni_task.stop()
+    @property
+    def number_of_channels(self):
+        """
+        The number of analog input channels.
 
-        # If we use an external trigger, we need to re-start the task, or
-        # else the next acquisition won't work because the task would be
-        # still stopped.
-        if self._ni_task_number_of_trigger_channels > 0:
-            self._ni_task.start()
+        """
+        return self._ni_task_number_of_channels
+
+    @property
+    def samples_acquired(self):
+        """
+        The number of samples acquired by the continuous acquisition so
+        far.
 
-        return read
+        """
+        if self._ring_buffer is None:
+            return 0
+        return self._ring_buffer.samples_written
 
-    trigger = get_data
+    @property
+    def test_mode(self):
+        return self._test_mode
 
     @property
     def sampling_duration(self):
@@ -523,10 +1953,14 @@ class AnalogInput(object):
 
     @sampling_duration.setter
     def sampling_duration(self, duration):
+        if self.continuous:
+            raise RuntimeError('Cannot change the sampling duration during '
+                               'continuous acquisition.')
+
         self._ni_task.stop()
         self._sampling_duration = duration
-        self._samples_to_acquire = self._sampling_rate * \
-                                   self._sampling_duration
+        self._samples_to_acquire = int(np.floor(self._sampling_rate *
+                                                self._sampling_duration))
         self._ni_task.configure_timing_sample_clock(
             rate=self._sampling_rate,
             sample_mode='finite',
@@ -549,10 +1983,14 @@ class AnalogInput(object):
 
     @sampling_rate.setter
     def sampling_rate(self, sampling_rate):
+        if self.continuous:
+            raise RuntimeError('Cannot change the sampling rate during '
+                               'continuous acquisition.')
+
         self._ni_task.stop()
         self._sampling_rate = sampling_rate
-        self._samples_to_acquire = \
-            np.ceil(self._sampling_rate * self._sampling_duration)
+        self._samples_to_acquire = int(np.floor(self._sampling_rate *
+                                                self._sampling_duration))
         self._ni_task.configure_timing_sample_clock(
             rate=sampling_rate,
             sample_mode='finite',
@@ -584,8 +2022,10 @@ class Gustometer(_StimulationApparatus):
                  gusto_ip='192.168.0.1', gusto_port=40175,
                  ni_trigger_in_line='PFI14',
                  ni_trigger_in_task_name='GustometerIn',
+                 ni_ai_line='Dev1/ai0',
                  use_threads=False,
-                 test_mode=False):
+                 test_mode=False,
+                 scheduler=None):
         """
         Parameters
         ----------
@@ -611,26 +2051,39 @@ class Gustometer(_StimulationApparatus):
         ni_trigger_in_task_name : string, optional
             The name to assign to the trigger input task.
             Defaults to ``GustometerIn``.
+        ni_ai_line : string, optional
+            The analog input line used by the trigger input task. The task
+            is only used to wait for the trigger on `ni_trigger_in_line`,
+            and no data is acquired from this line. Choose a line that is
+            not used by other tasks, e.g. an `AnalogInput`.
+            Defaults to ``Dev1/ai0``.
         use_threads : bool, optional
-            Whether a Python thread should be created when
-            `select_stimulus` is called. This thread would then allow
-            non-blocking stimulation.
+            Whether the stimulation should be executed by a worker thread,
+            allowing for non-blocking stimulation. The thread is created
+            once and then reused for all stimulations.
             Defaults to ``False``.
         test_mode : bool, optional
             If ``True``, the NI board will not actually be initialized or used
             in any manner. This allows for testing the program logic on a
             computer without a DAQ card.
             Defaults to ``False``.
+        scheduler : Scheduler, optional
+            The scheduler to use for timing the stimulation. If ``None``,
+            create a new scheduler using the ``psychopy.core.getTime``
+            timebase (or ``timeit.default_timer`` in test mode).
 
         """
-        super(Gustometer, self).__init__(test_mode=test_mode)
+        super(Gustometer, self).__init__(test_mode=test_mode,
+                                         scheduler=scheduler)
         self._pulse_duration = pulse_duration
         self._pause_duration = pause_duration
         self._classfile = None
         self._gusto_ip = gusto_ip
         self._gusto_port = gusto_port
         self._use_threads = use_threads
-        self._thread = None
+        self._worker = None
+        if self._use_threads:
+            self._start_worker()
         # FIXME add parameter to docs.
 
         if not self.test_mode:
@@ -651,9 +2104,11 @@ class Gustometer(_StimulationApparatus):
             #     samples_per_channel=1
             # )
             #
-            self._ni_ai_task = nidaqmx.AnalogInputTask(name=ni_trigger_in_task_name)
+            self._ni_ai_task = _get_nidaqmx().AnalogInputTask(
+                name=ni_trigger_in_task_name
+            )
             if not self._ni_ai_task.create_voltage_channel(
-                    'Dev1/ai0', min_val=-10, max_val=10):
+                    ni_ai_line, min_val=-10, max_val=10):
                 raise IOError('Could not create analog input channel.')
 
             if not self._ni_ai_task.configure_timing_sample_clock(
@@ -690,6 +2145,7 @@ class Gustometer(_StimulationApparatus):
         self._mode = 'edit'
 
     def __del__(self):
+        self._stop_worker()
         if not self.test_mode:
             self._ni_ai_task.clear()
             self._socket.close()
@@ -833,9 +2289,6 @@ class Gustometer(_StimulationApparatus):
             self._ni_ai_task.stop()
             self._ni_ai_task.start()
 
-        if self._use_threads:
-            self._thread = threading.Thread(target=self._stimulate)
-
     def stimulate(self, blocking_wait=False):
         """
         Start the stimulation with the currently selected stimulus.
@@ -843,12 +2296,20 @@ class Gustometer(_StimulationApparatus):
         Parameters
         ----------
         blocking_wait : bool, optional
-            Specifies whether the stimulation thread should be `joined` or
-            not, i.e. whether we should wait for it to finish (blocking
-            other operations), or return immediately. This parameter will
-            be ignored if threads are not used for stimulation.
+            Specifies whether we should wait for the stimulation thread to
+            finish the stimulation (blocking other operations), or return
+            immediately. This parameter will be ignored if threads are not
+            used for stimulation.
             Defaults to `False`, i.e. non-blocking behavior.
 
+        Returns
+        -------
+        ScheduledEvent or Future
+            The scheduled and actual onset time of the stimulation. If
+            threads are used, a `concurrent.futures.Future` is returned
+            instead, which resolves to the onset time once the stimulation
+            has finished.
+
         See Also
         --------
         add_stimulus
@@ -856,38 +2317,29 @@ class Gustometer(_StimulationApparatus):
 
         Notes
         -----
-        ``stimulate`` invokes ``_stimulate``, which itself unsets the
-        currently selected stimulus at the end of the stimulation. You have
-        to invoke ``select_stimulus`` again before you can call
-        ``stimulate`` again.
+        The stimulus remains selected after the stimulation, so
+        ``stimulate`` can be called repeatedly to present the same stimulus
+        again. If threads are used, all stimulations are executed one after
+        the other by a single, long-lived worker thread; stimulations
+        requested while another stimulation is still running are queued.
+        If a non-blocking stimulation fails, a warning is issued, and the
+        exception is raised again by the next call to ``stimulate``.
         """
-        if not self._stimulus:
-            raise ValueError('No stimulus selected. Please invoke '
-                             '``select_stimulus()`` first.')
+        return self._dispatch_stimulation(blocking_wait)
 
-        if self._use_threads:
-            self._thread.start()
-            if blocking_wait:
-                self._thread.join()
-        else:
-            self._stimulate()
-
-    def _stimulate(self):
+    def _stimulate(self, stimulus):
         message = 'TRIGSTART 1 1'
-        trigger_time = self._stimulus['trigger_time']
-
-        if trigger_time is not None:
-            if psychopy.core.getTime() < trigger_time:
-                psychopy.core.wait(
-                    trigger_time - psychopy.core.getTime(),
-                    hogCPUperiod=(
-                                 trigger_time - psychopy.core.getTime()) / 5
-                )
 
+        onset = self._scheduler.wait_until(stimulus['trigger_time'])
         self._send(message)
-        if not self.test_mode and self._stimulus['wait_for_gusto_trigger']:
+        if not self.test_mode and stimulus['wait_for_gusto_trigger']:
             self._ni_ai_task.wait_until_done()
-        self._stimulus = None
+
+            # Re-arm the trigger input for the next stimulation.
+            self._ni_ai_task.stop()
+            self._ni_ai_task.start()
+
+        return onset
 
 
 class Trigger(_StimulationApparatus):
@@ -895,11 +2347,17 @@ class Trigger(_StimulationApparatus):
     Send triggers, e.g. to the EEG system.
 
     """
+    # The maximum number of lines for which to precompute all bitmasks.
+    _max_lookup_table_bits = 16
+
     def __init__(self, ni_lines='Dev1/PFI2:9',
                  ni_start_trigger_line=None,
                  ni_task_name='Triggers',
                  use_threads=False,
-                 test_mode=False):
+                 test_mode=False,
+                 scheduler=None,
+                 hardware_timed=False,
+                 sample_rate=10000):
         """
         Parameters
         ----------
@@ -914,20 +2372,54 @@ class Trigger(_StimulationApparatus):
             The name of the NI DAQ task to create.
             Defaults to ``Triggers``.
         use_threads : bool, optional
-            Whether a Python thread should be created when
-            `select_stimulus` is called. This thread would then allow
-            non-blocking stimulation.
+            Whether the stimulation should be executed by a worker thread,
+            allowing for non-blocking stimulation. The thread is created
+            once and then reused for all stimulations.
             Defaults to ``False``.
         test_mode : bool, optional
             If ``True``, the NI board will not actually be initialized or used
             in any manner. This allows for testing the program logic on a
             computer without a DAQ card.
             Defaults to ``False``.
+        scheduler : Scheduler, optional
+            The scheduler to use for timing the stimulation. If ``None``,
+            create a new scheduler using the ``psychopy.core.getTime``
+            timebase (or ``timeit.default_timer`` in test mode).
+        hardware_timed : bool, optional
+            If ``True``, every trigger pulse is generated as a buffered
+            waveform that is clocked out by the NI board at `sample_rate`,
+            so the pulse width is exact. The waveform is compiled when
+            adding the trigger.
+            Defaults to ``False``.
+        sample_rate : float, optional
+            The sample rate (in Hz) of the hardware-timed output. Trigger
+            durations are rounded to multiples of the sample period.
+            Defaults to 10 kHz.
+
+        Notes
+        -----
+        Hardware-timed output requires lines that support buffered
+        generation; on M and X Series boards, these are the lines of
+        ``port0`` only. The default `ni_lines` (``PFI`` lines) only support
+        software-timed output on these boards.
+
+        In hardware-timed mode, the waveform is transferred to the NI board
+        before the trigger time, and its generation is started at the
+        trigger time. ``trigger`` returns as soon as the generation has
+        started (even if ``blocking_wait=True``), and the returned onset is
+        the time of the start. The generation is completed by the board;
+        a subsequent trigger waits for it to finish. Triggers without a
+        duration cannot be generated, since the trigger lines are always
+        reset at the end of the waveform.
+
+        """
+        super(Trigger, self).__init__(test_mode=test_mode,
+                                      scheduler=scheduler)
+        self._hardware_timed = hardware_timed
+        self._sample_rate = sample_rate
 
-        """
-        super(Trigger, self).__init__(test_mode=test_mode)
         if not self.test_mode:
-            self._ni_task = nidaqmx.DigitalOutputTask(name=ni_task_name)
+            self._ni_task = _get_nidaqmx().DigitalOutputTask(name=ni_task_name)
 
             # Add the trigger channels.
             if not self._ni_task.create_channel(ni_lines):
@@ -949,16 +2441,48 @@ class Trigger(_StimulationApparatus):
                     raise IOError('Could not configure trigger channel.')
 
                 # Data generation is set to be triggered by an external
-                # trigger. Thus we can start the task immediately.
-                if not self._ni_task.start():
+                # trigger. Thus we can start the task immediately. In
+                # hardware-timed mode, the task is started when writing the
+                # waveform.
+                if not self._hardware_timed and not self._ni_task.start():
                     raise IOError('Could not start digital output task.')
         else:
             self._ni_task_number_of_channels = 8
+            self._ni_task = _SimulatedDigitalOutputTask(
+                name=ni_task_name, number_of_channels=8)
+            if ni_start_trigger_line is not None:
+                self._ni_task.configure_trigger_digital_edge_start(
+                    ni_start_trigger_line)
+
+        # Look-up table of the bitmasks of all trigger codes that can be
+        # represented with the available lines; row `i` holds the bitmask
+        # of code `i`, with the least significant bit first. Sending a
+        # trigger then only requires a table lookup. The table has 2**bits
+        # rows, so for wider tasks, the bitmasks are computed on demand.
+        bits = self._ni_task_number_of_channels
+        self._max_trigger_code = 2**bits - 1
+        self._bit_shifts = np.arange(bits)
+        if bits <= self._max_lookup_table_bits:
+            codes = np.arange(2**bits)
+            self._bitmask_lut = ((codes[:, np.newaxis] >> self._bit_shifts) &
+                                 1).astype(np.uint8)
+            self._bitmask_lut.setflags(write=False)
+            self._send_buffer = None
+        else:
+            self._bitmask_lut = None
+            self._send_buffer = np.empty(bits, dtype=np.uint8)
+
+        self._bitmask_offset = np.zeros(bits, dtype=np.uint8)
+        self._bitmask_offset.setflags(write=False)
 
         self._use_threads = use_threads
-        self._thread = None
+        self._worker = None
+        if self._use_threads:
+            self._start_worker()
 
     def __del__(self):
+        self._stop_worker()
+        self._finish_waveform()
         if not self.test_mode:
             self._ni_task.clear()
         del self
@@ -1002,22 +2526,267 @@ class Trigger(_StimulationApparatus):
         stimulate
 
         """
-        bits = self._ni_task_number_of_channels
-        max_val = 2**bits - 1  # Maximum integer value we can represent with this no. of bits.
+        bitmask = self._get_bitmask(self._get_trigger_code(trig_num))
+        if self._bitmask_lut is None:
+            bitmask.setflags(write=False)
 
-        if trig_num > max_val:
-            trig_num = max_val
+        if self._hardware_timed:
+            if duration is None:
+                raise ValueError('Triggers without a duration are not '
+                                 'supported in hardware-timed mode.')
 
-        bitmask = np.array(
-            list(bin(trig_num)[2:].zfill(bits))[::-1],  # Most significant bit RIGHT, not left!
-            dtype=np.uint8
-        )
+            n_onset = self._duration_to_samples(duration)
+            waveform = np.zeros((n_onset + 1, bitmask.shape[0]),
+                                dtype=np.uint8)
+            waveform[:n_onset] = bitmask
+            waveform.setflags(write=False)
+        else:
+            waveform = None
 
         super(Trigger, self).add_stimulus(
                 name=name, bitmask=bitmask, duration=duration,
-                trigger_time=trigger_time, replace=replace, **kwargs
+                trigger_time=trigger_time, _ni_waveform=waveform,
+                replace=replace, **kwargs
         )
 
+    def _get_trigger_code(self, trig_num):
+        """
+        Return the trigger code for `trig_num`. Numbers that are too large
+        to be represented with the available lines are clipped to the
+        maximum.
+
+        """
+        if trig_num < 0:
+            raise ValueError('Trigger numbers must be non-negative.')
+
+        return min(trig_num, self._max_trigger_code)
+
+    def _get_bitmask(self, code, out=None):
+        """
+        Return the bitmask of a trigger code, least significant bit first.
+
+        With a look-up table, this is a read-only view into the table.
+        Otherwise, the bitmask is computed, and stored in `out` if
+        specified, or in a new array.
+
+        """
+        if self._bitmask_lut is not None:
+            return self._bitmask_lut[code]
+
+        if out is None:
+            out = np.empty(self._bit_shifts.shape[0], dtype=np.uint8)
+
+        # Truncating the shifted code to uint8 retains its lowest bit.
+        np.right_shift(code, self._bit_shifts, out=out, casting='unsafe')
+        np.bitwise_and(out, 1, out=out)
+        return out
+
+    def send(self, trig_num, duration=None, trigger_time=None):
+        """
+        Send a trigger code directly, without adding and selecting it
+        first.
+
+        The bitmask is taken from a precomputed look-up table, so no
+        memory is allocated for the trigger. The trigger is always sent
+        from the calling thread and in software-timed fashion.
+
+        Parameters
+        ----------
+        trig_num : int
+            The trigger to send. Numbers that cannot be represented with
+            the available lines are clipped to the maximum.
+        duration : float or None, optional
+            The duration of the trigger HIGH voltage, specified in seconds.
+            If ``None``, the trigger lines are left in the HIGH state.
+            Defaults to ``None``.
+        trigger_time : float, optional
+            The time (in terms of the ``psychopy.core.getTime`` timebase)
+            at which to send the trigger. If ``None``, send immediately.
+            Defaults to ``None``.
+
+        Returns
+        -------
+        ScheduledEvent
+            The scheduled and actual onset time of the trigger.
+
+        Notes
+        -----
+        This method is not available in hardware-timed mode, because the
+        NI task is then configured for buffered output. If threads are
+        used, the trigger is not queued behind stimulations that are still
+        running on the worker thread.
+
+        """
+        if self._hardware_timed:
+            raise ValueError('send() is not available in hardware-timed '
+                             'mode. Please use trigger() instead.')
+
+        bitmask = self._get_bitmask(self._get_trigger_code(trig_num),
+                                    out=self._send_buffer)
+        onset = self._scheduler.wait_until(trigger_time)
+
+        if self._ni_task.write(bitmask) <= 0:
+            raise IOError('Could not write onset bitmask.')
+
+        if duration is not None:
+            self._scheduler.wait(duration)
+            if self._ni_task.write(self._bitmask_offset) <= 0:
+                raise IOError('Could not write offset bitmask.')
+
+        return onset
+
+    def send_sequence(self, sequence, start_time=None, blocking_wait=False):
+        """
+        Send a sequence of triggers, e.g. for rapid serial presentation
+        paradigms.
+
+        The entire sequence is validated and compiled up front. In
+        hardware-timed mode, it is generated as a single waveform;
+        otherwise, the triggers are sent by the scheduler one after the
+        other, without any further per-trigger setup.
+
+        Parameters
+        ----------
+        sequence : array_like
+            The triggers to send, of shape ``(n_triggers, 3)``. Every row
+            contains the trigger number, its onset (in seconds, relative to
+            `start_time`), and its duration (in seconds). The rows must be
+            sorted by onset, and the triggers must not overlap. In
+            hardware-timed mode, consecutive triggers must be separated by
+            at least one sample, during which all lines are reset.
+        start_time : float, optional
+            The time (in terms of the ``psychopy.core.getTime`` timebase)
+            relative to which the onsets are specified. If ``None``, start
+            immediately, i.e. as soon as the worker thread (if used) is
+            available.
+            Defaults to ``None``.
+        blocking_wait : bool, optional
+            Specifies whether we should wait for the trigger thread to
+            finish the sequence, or return immediately. This parameter will
+            be ignored if threads are not used for stimulation.
+            Defaults to `False`, i.e. non-blocking behavior.
+
+        Returns
+        -------
+        ndarray or Future
+            The onset times of all triggers (in terms of the
+            ``psychopy.core.getTime`` timebase). If threads are used, a
+            `concurrent.futures.Future` is returned instead, which
+            resolves to the onset times once the sequence has finished.
+
+        Notes
+        -----
+        In software-timed mode, the onsets are measured before every
+        trigger is written. In hardware-timed mode, the waveform is
+        transferred to the NI board before `start_time`, and only the
+        start of its generation is measured (after the task has been
+        started); the onsets are derived from it and the sample rate. The
+        method then returns without waiting for the generation to finish.
+
+        """
+        codes, onsets, offsets = self._compile_sequence(sequence)
+
+        if self._hardware_timed:
+            onset_samples, waveform = self._compile_sequence_waveform(
+                codes, onsets, offsets)
+            function = self._send_sequence_waveform
+            args = (onset_samples, waveform, start_time)
+        else:
+            function = self._send_sequence
+            args = (codes, onsets, offsets, start_time)
+
+        return self._submit(function, *args, blocking_wait=blocking_wait)
+
+    def _compile_sequence(self, sequence):
+        """
+        Validate a trigger sequence, and split it into the trigger codes
+        (rows of the look-up table), onsets, and offsets.
+
+        """
+        sequence = np.asarray(sequence, dtype=np.float64)
+        if sequence.ndim != 2 or sequence.shape[1] != 3:
+            raise ValueError('The sequence must be of shape (n_triggers, 3), '
+                             'with rows of (trig_num, onset, duration).')
+        if sequence.shape[0] == 0:
+            raise ValueError('The sequence must contain at least one '
+                             'trigger.')
+
+        trig_nums, onsets, durations = sequence.T
+
+        if (trig_nums < 0).any():
+            raise ValueError('Trigger numbers must be non-negative.')
+        if (trig_nums != np.round(trig_nums)).any():
+            raise ValueError('Trigger numbers must be integers.')
+        if (durations <= 0).any():
+            raise ValueError('Trigger durations must be positive.')
+        if (np.diff(onsets) < 0).any():
+            raise ValueError('The sequence must be sorted by onset.')
+
+        offsets = onsets + durations
+        if (onsets[1:] < offsets[:-1]).any():
+            raise ValueError('Triggers in the sequence must not overlap.')
+
+        codes = np.minimum(trig_nums.astype(np.int64),
+                           self._max_trigger_code)
+        return codes, onsets, offsets
+
+    def _compile_sequence_waveform(self, codes, onsets, offsets):
+        """
+        Compile a trigger sequence into a waveform of shape
+        ``(samples, channels)``. The last sample resets all lines.
+
+        """
+        onset_samples = np.round(onsets * self._sample_rate).astype(np.int64)
+        offset_samples = np.round(offsets * self._sample_rate).astype(np.int64)
+        offset_samples = np.maximum(offset_samples, onset_samples + 1)
+
+        # Without a reset sample in between, adjacent triggers would merge
+        # into a single pulse if their codes were equal.
+        if (onset_samples[1:] <= offset_samples[:-1]).any():
+            raise ValueError('Triggers in the sequence must be separated by '
+                             'at least one sample at a sample rate of %s Hz.'
+                             % self._sample_rate)
+
+        # Mark the changes of the trigger code at every onset and offset;
+        # their cumulative sum yields the code for every sample.
+        n_samples = offset_samples[-1] + 1
+        code_changes = np.zeros(n_samples, dtype=np.int64)
+        code_changes[onset_samples] = codes
+        code_changes[offset_samples] = -codes
+
+        samples = np.cumsum(code_changes)
+        if self._bitmask_lut is not None:
+            waveform = self._bitmask_lut[samples]
+        else:
+            waveform = ((samples[:, np.newaxis] >> self._bit_shifts) &
+                        1).astype(np.uint8)
+        return onset_samples, waveform
+
+    def _send_sequence(self, codes, onsets, offsets, start_time):
+        if start_time is None:
+            start_time = self._scheduler.get_time()
+
+        measured_onsets = np.empty(codes.shape[0])
+        bitmask = np.empty(self._bit_shifts.shape[0], dtype=np.uint8)
+
+        for i in range(codes.shape[0]):
+            event = self._scheduler.wait_until(start_time + onsets[i])
+            if self._ni_task.write(self._get_bitmask(codes[i],
+                                                     out=bitmask)) <= 0:
+                raise IOError('Could not write onset bitmask.')
+            measured_onsets[i] = event.onset
+
+            self._scheduler.wait_until(start_time + offsets[i], record=False)
+            if self._ni_task.write(self._bitmask_offset) <= 0:
+                raise IOError('Could not write offset bitmask.')
+
+        return measured_onsets
+
+    def _send_sequence_waveform(self, onset_samples, waveform, start_time):
+        self._load_waveform(waveform)
+        start = self._start_waveform(start_time)
+        return start.onset + onset_samples / self._sample_rate
+
     def select_stimulus(self, name):
         self.select_trigger(name)
 
@@ -1033,14 +2802,11 @@ class Trigger(_StimulationApparatus):
         """
         super(Trigger, self).select_stimulus(name)
 
-        if self._use_threads:
-            self._thread = threading.Thread(target=self._stimulate)
-
     def remove_trigger(self, name):
         self.remove_stimulus(name)
 
     def trigger(self, blocking_wait=False):
-        self.stimulate(blocking_wait=blocking_wait)
+        return self.stimulate(blocking_wait=blocking_wait)
 
     def stimulate(self, blocking_wait=False):
         """
@@ -1049,12 +2815,20 @@ class Trigger(_StimulationApparatus):
         Parameters
         ----------
         blocking_wait : bool, optional
-            Specifies whether the trigger thread should be `joined` or
-            not, i.e. whether we should wait for it to finish (blocking
-            other operations), or return immediately. This parameter will
-            be ignored if threads are not used for stimulation.
+            Specifies whether we should wait for the trigger thread to
+            finish the trigger generation (blocking other operations), or
+            return immediately. This parameter will be ignored if threads
+            are not used for stimulation.
             Defaults to `False`, i.e. non-blocking behavior.
 
+        Returns
+        -------
+        ScheduledEvent or Future
+            The scheduled and actual onset time of the trigger. If threads
+            are used, a `concurrent.futures.Future` is returned instead,
+            which resolves to the onset time once the trigger generation
+            has finished.
+
         See Also
         --------
         add_trigger
@@ -1064,47 +2838,37 @@ class Trigger(_StimulationApparatus):
 
         Notes
         -----
-        ``trigger`` invokes ``_trigger``, which itself unsets the
-        currently selected trigger at the end of the generation. You have
-        to invoke ``select_trigger`` again before you can call
-        ``trigger`` again.
+        The trigger remains selected after its generation, so ``trigger``
+        can be called repeatedly to send the same trigger again. If threads
+        are used, all triggers are generated one after the other by a
+        single, long-lived worker thread. If a non-blocking trigger
+        generation fails, a warning is issued, and the exception is raised
+        again by the next call to ``trigger``.
 
         """
-        if not self._stimulus:
-            raise ValueError('No stimulus selected. Please invoke '
-                             '``select_stimulus()`` first.')
+        return self._dispatch_stimulation(blocking_wait)
 
-        if self._use_threads:
-            self._thread.start()
-            if blocking_wait:
-                self._thread.join()
-        else:
-            self._stimulate()
-
-    def _stimulate(self):
-        stimulus_duration = self._stimulus['duration']
-        bitmask = self._stimulus['bitmask']
-        trigger_time = self._stimulus['trigger_time']
-
-        if trigger_time is not None:
-            if psychopy.core.getTime() < trigger_time:
-                psychopy.core.wait(
-                        trigger_time - psychopy.core.getTime(),
-                        hogCPUperiod=(trigger_time - psychopy.core.getTime()) / 5
-                )
+    def _stimulate(self, stimulus):
+        stimulus_duration = stimulus['duration']
+        bitmask = stimulus['bitmask']
 
-        if not self.test_mode:
-            if self._ni_task.write(bitmask) <= 0:
-                raise IOError('Could not write onset bitmask.')
+        # Set up the DAQ before the trigger time, so that the trigger time
+        # does not include any setup latency.
+        if self._hardware_timed:
+            self._load_waveform(stimulus['_ni_waveform'])
+            return self._start_waveform(stimulus['trigger_time'])
+
+        onset = self._scheduler.wait_until(stimulus['trigger_time'])
+
+        if self._ni_task.write(bitmask) <= 0:
+            raise IOError('Could not write onset bitmask.')
 
         if stimulus_duration is not None:
-            psychopy.core.wait(stimulus_duration,
-                               hogCPUperiod=stimulus_duration/5)
-            bitmask = np.zeros(self._ni_task_number_of_channels)
-            if self._ni_task.write(bitmask) <= 0:
+            self._scheduler.wait(stimulus_duration)
+            if self._ni_task.write(self._bitmask_offset) <= 0:
                 raise IOError('Could not write offset bitmask.')
 
-        self._stimulus = None
+        return onset
 
 
 class EEG(object):
@@ -5,21 +5,175 @@ Some basic image processing routines.
 
 """
 
-from __future__ import unicode_literals
+from __future__ import division, unicode_literals
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import pickle
 import numpy as np
-from scipy.misc import imread
-from scipy import ndimage
-import pyfftw
-from pyfftw.interfaces.scipy_fftpack import fft2
 
-# Enable cache for FFTW to speed up calculations
-pyfftw.interfaces.cache.enable()
-pyfftw.interfaces.cache.set_keepalive_time(60)
+# pyfftw is imported on first use only, see _get_pyfftw().
+_pyfftw = None
+_cache_keepalive = 60
 
+# Keyword arguments passed to all pyfftw.interfaces calls. Use
+# `configure_fftw()` to change them.
+_fftw_kwargs = dict(planner_effort='FFTW_ESTIMATE', threads=1)
+_planner_efforts = ('FFTW_ESTIMATE', 'FFTW_MEASURE', 'FFTW_PATIENT',
+                    'FFTW_EXHAUSTIVE')
+
+# Gaussian transfer functions, keyed by (image shape, sigma).
+_gaussian_transfer_functions = dict()
+
+# Integer radius maps of the spectra, keyed by (spectrum shape, image width).
+_radius_maps = dict()
+
+# Forward and inverse real-input FFTW plans for batches of images, keyed by
+# (batch shape, planner effort, threads). Every plan holds buffers of the
+# size of a batch, so only the most recently used plans are kept.
+_rfft2_plans = OrderedDict()
+_max_rfft2_plans = 4
+
+
+def _get_pyfftw():
+    """
+    Import pyfftw and enable its plan cache.
+
+    This is deferred until the first transform, so that importing this
+    module is cheap and free of side effects.
+
+    """
+    global _pyfftw
+
+    if _pyfftw is None:
+        import pyfftw
+        import pyfftw.builders
+        import pyfftw.interfaces.cache
+        import pyfftw.interfaces.numpy_fft
+        import pyfftw.interfaces.scipy_fftpack
+
+        # Enable cache for FFTW to speed up calculations
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(_cache_keepalive)
+        _pyfftw = pyfftw
+
+    return _pyfftw
+
+
+def configure_fftw(planner_effort=None, threads=None, cache_keepalive=None):
+    """
+    Configure how FFTW plans and executes the transforms in this module.
+
+    Parameters
+    ----------
+    planner_effort : string, optional
+        How much effort FFTW should put into finding a fast plan. One of
+        ``estimate``, ``measure``, ``patient``, or ``exhaustive`` (the
+        ``FFTW_`` prefixed names are accepted, too). Higher efforts take
+        longer to plan, but may yield faster transforms. Plans can be
+        persisted across sessions using `export_wisdom`.
+        If ``None``, leave the current setting (initially ``estimate``)
+        unchanged.
+
+    threads : int, optional
+        The number of threads FFTW may use. If ``None``, leave the current
+        setting (initially ``1``) unchanged.
+
+    cache_keepalive : float, optional
+        The time (in seconds) for which unused plans are kept in the
+        `pyfftw.interfaces` cache. If ``None``, leave the current setting
+        (initially 60 seconds) unchanged.
+
+    See Also
+    --------
+    export_wisdom, import_wisdom
+
+    """
+    global _cache_keepalive
+
+    if planner_effort is not None:
+        planner_effort = planner_effort.upper()
+        if not planner_effort.startswith('FFTW_'):
+            planner_effort = 'FFTW_' + planner_effort
+
+        if planner_effort not in _planner_efforts:
+            raise ValueError('`planner_effort` must be one of: estimate, '
+                             'measure, patient, exhaustive.')
+
+        _fftw_kwargs['planner_effort'] = planner_effort
+
+    if threads is not None:
+        if int(threads) < 1:
+            raise ValueError('`threads` must be a positive integer.')
+        _fftw_kwargs['threads'] = int(threads)
+
+    if cache_keepalive is not None:
+        _cache_keepalive = cache_keepalive
+        if _pyfftw is not None:
+            _pyfftw.interfaces.cache.set_keepalive_time(cache_keepalive)
+
+
+def export_wisdom(filename):
+    """
+    Save the FFTW wisdom (i.e., all plans created so far) to a file.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the file to write.
+
+    See Also
+    --------
+    import_wisdom, configure_fftw
+
+    """
+    with open(filename, 'wb') as f:
+        pickle.dump(_get_pyfftw().export_wisdom(), f, protocol=2)
+
+
+def import_wisdom(filename):
+    """
+    Load FFTW wisdom previously saved using `export_wisdom`.
+
+    Importing wisdom allows FFTW to skip planning for transforms it has
+    already planned in a previous session, even when using a high
+    planner effort.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the file to load.
+
+    Returns
+    -------
+    tuple of bool
+        Whether the wisdom for double, single, and long double precision
+        transforms, respectively, could be imported.
+
+    See Also
+    --------
+    export_wisdom, configure_fftw
 
-def fft_image(image):
+    """
+    with open(filename, 'rb') as f:
+        wisdom = pickle.load(f)
+
+    # Wisdom pickled with Python 2 is loaded as text.
+    wisdom = tuple(w.encode('ascii') if not isinstance(w, bytes) else w
+                   for w in wisdom)
+    return _get_pyfftw().import_wisdom(wisdom)
+
+
+_FFTResult = namedtuple('Image', 'FFT Amplitude Phase')
+_RadialSpectrum = namedtuple('RadialSpectrum', 'Frequency Amplitude')
+_SpectralSlope = namedtuple('SpectralSlope', 'Slope Intercept')
+
+
+def fft_image(image, use_rfft=False, return_fft=True, return_amplitude=True,
+              return_phase=True):
     """
     Perform an FFT on the supplied image array.
 
@@ -28,23 +182,655 @@ def fft_image(image):
     image : ndarray
         An array of the image
 
+    use_rfft : bool, optional
+        Whether to use a real-input FFT (`rfft2`). As the spectrum of a
+        real-valued image is Hermitian-symmetric, only the non-negative
+        frequencies along the last axis are computed and returned, i.e.
+        the outputs have the shape ``(M, N // 2 + 1)`` for an image of
+        shape ``(M, N)``. This roughly halves computation time and memory
+        usage. Defaults to ``False``.
+
+    return_fft : bool, optional
+        Whether to return the complex FFT. Defaults to ``True``.
+
+    return_amplitude : bool, optional
+        Whether to compute and return the amplitude spectrum.
+        Defaults to ``True``.
+
+    return_phase : bool, optional
+        Whether to compute and return the phase spectrum.
+        Defaults to ``True``.
+
     Returns
     -------
     namedtuple
         A namedtuple containing the the fast-fourier transform, the
-        amplitude and phase.
+        amplitude and phase. Outputs that were not requested are set to
+        ``None``.
 
     """
-    image_fft = fft2(image)
-    image_amplitude = np.abs(image_fft)
-    image_phase = np.angle(image_fft)
+    pyfftw = _get_pyfftw()
+
+    if use_rfft:
+        image_fft = pyfftw.interfaces.numpy_fft.rfft2(image, **_fftw_kwargs)
+    else:
+        image_fft = pyfftw.interfaces.scipy_fftpack.fft2(image,
+                                                         **_fftw_kwargs)
+
+    image_amplitude = np.abs(image_fft) if return_amplitude else None
+    image_phase = np.angle(image_fft) if return_phase else None
+
+    if not return_fft:
+        image_fft = None
+
+    return _FFTResult(image_fft, image_amplitude, image_phase)
+
+
+def fft_images_to_npy(images, fft_filename=None, amplitude_filename=None,
+                      phase_filename=None, use_rfft=False, n_images=None):
+    """
+    Perform an FFT on a set of images, and write the results directly to
+    memory-mapped ``.npy`` files.
+
+    Each requested output is stored as one stacked array of shape
+    ``(n_images, ...)``, which is preallocated on disk and filled image by
+    image. This way, the spectra of arbitrarily large image sets can be
+    computed without holding them in memory. The files can later be opened
+    using ``np.load(filename, mmap_mode='r')``.
+
+    Parameters
+    ----------
+    images : array_like or iterable of ndarrays
+        The images to process. Either a stack of images of shape
+        ``(n_images, height, width)``, or an iterable of images of equal
+        shape. Iterables are consumed lazily.
+
+    fft_filename : string, optional
+        The name of the file to store the complex FFTs in. If ``None``, the
+        FFTs will not be stored.
+
+    amplitude_filename : string, optional
+        The name of the file to store the amplitude spectra in. If
+        ``None``, the amplitude spectra will not be computed.
+
+    phase_filename : string, optional
+        The name of the file to store the phase spectra in. If ``None``, the
+        phase spectra will not be computed.
+
+    use_rfft : bool, optional
+        Whether to use a real-input FFT. See `fft_image`.
+        Defaults to ``False``.
+
+    n_images : int, optional
+        The number of images. Only required if `images` is an iterable
+        without a length, e.g. a generator.
+
+    Returns
+    -------
+    namedtuple
+        A namedtuple containing the memory-mapped FFT, amplitude, and phase
+        arrays. Outputs that were not requested are set to ``None``.
+
+    See Also
+    --------
+    fft_image
+
+    """
+    filenames = _FFTResult(fft_filename, amplitude_filename, phase_filename)
+    if all(filename is None for filename in filenames):
+        raise ValueError('Please specify at least one output filename.')
+
+    if n_images is None:
+        try:
+            n_images = len(images)
+        except TypeError:
+            raise TypeError('Please specify `n_images` if passing an '
+                            'iterable without a length.')
+
+    outputs = None
+    image_count = 0
+
+    for image_count, image in enumerate(images, start=1):
+        if image_count > n_images:
+            raise ValueError('Got more than `n_images` images.')
+
+        result = fft_image(image, use_rfft=use_rfft,
+                           return_fft=fft_filename is not None,
+                           return_amplitude=amplitude_filename is not None,
+                           return_phase=phase_filename is not None)
+
+        # Allocate the output files once we know the shape and data type
+        # of the results.
+        if outputs is None:
+            outputs = _FFTResult(*[
+                None if filename is None else
+                np.lib.format.open_memmap(filename, mode='w+',
+                                          dtype=data.dtype,
+                                          shape=(n_images,) + data.shape)
+                for filename, data in zip(filenames, result)
+            ])
+
+        for output, data in zip(outputs, result):
+            if output is not None:
+                output[image_count - 1] = data
+
+    if image_count != n_images:
+        raise ValueError('Expected %d images, but got %d.'
+                         % (n_images, image_count))
+    elif outputs is None:
+        raise ValueError('No images supplied.')
+
+    for output in outputs:
+        if output is not None:
+            output.flush()
+
+    return outputs
+
+
+def _get_radius_map(shape, image_width):
+    """
+    Return the integer radius map, the weights of the individual
+    frequencies, the number of radius bins, and the (weighted) number of
+    frequencies per bin for a spectrum of the given shape.
+
+    """
+    key = (tuple(shape), image_width)
+
+    try:
+        return _radius_maps[key]
+    except KeyError:
+        pass
+
+    height, width = shape
+    n_cycles = min(height, image_width)
+    n_bins = n_cycles // 2 + 1
+
+    freqs_y = np.fft.fftfreq(height)[:, np.newaxis]
+    if width == image_width:
+        freqs_x = np.fft.fftfreq(width)[np.newaxis, :]
+        weights = None
+    else:
+        freqs_x = np.fft.rfftfreq(image_width)[np.newaxis, :]
+
+        # A real-input FFT omits the negative frequencies along the last
+        # axis. Count the remaining frequencies twice, except for those
+        # without a negative counterpart (zero and, for even image widths,
+        # the Nyquist frequency).
+        weights = np.full(shape, 2.)
+        weights[:, 0] = 1
+        if image_width % 2 == 0:
+            weights[:, -1] = 1
+        weights = weights.ravel()
+        weights.setflags(write=False)
+
+    radius_map = np.rint(np.hypot(freqs_y, freqs_x) * n_cycles)
+    radius_map = radius_map.astype(np.intp).ravel()
+
+    # Frequencies beyond the Nyquist frequency of the shorter image side
+    # (i.e., the "corners" of the spectrum) are collected in an extra bin,
+    # which is discarded.
+    radius_map[radius_map > n_bins] = n_bins
+    counts = np.bincount(radius_map, weights=weights,
+                         minlength=n_bins + 1)[:n_bins]
+
+    radius_map.setflags(write=False)
+    counts.setflags(write=False)
+
+    _radius_maps[key] = (radius_map, weights, n_bins, counts)
+    return _radius_maps[key]
+
+
+def radial_amplitude_spectrum(amplitude, image_shape=None):
+    """
+    Calculate the radially averaged amplitude spectrum.
+
+    Parameters
+    ----------
+    amplitude : array_like
+        The amplitude spectrum as returned by `fft_image`, i.e. not shifted
+        (the zero frequency is the first element). Either of a single image,
+        of shape ``(height, width)``, or of a stack of images, of shape
+        ``(n_images, height, width)``.
+
+    image_shape : tuple of ints, optional
+        The shape of the original image(s). Required if the spectra were
+        calculated using a real-input FFT (``use_rfft=True``), as the width
+        of the images cannot be unambiguously derived from their spectra.
+        If ``None``, `amplitude` is assumed to contain full spectra.
+
+    Returns
+    -------
+    namedtuple
+        A namedtuple containing the frequencies (in cycles per pixel) and
+        the mean amplitude at these frequencies. For a stack of images, the
+        amplitudes are of shape ``(n_images, n_frequencies)``.
+
+    Notes
+    -----
+    The frequencies are binned in steps of one cycle per image along the
+    shorter image side, up to its Nyquist frequency.
+
+    See Also
+    --------
+    fft_image, spectral_slope
+
+    """
+    amplitude = np.asarray(amplitude)
+    shape = amplitude.shape[-2:]
+
+    if image_shape is None:
+        image_width = shape[1]
+    else:
+        image_width = image_shape[-1]
+        if (image_width // 2 + 1 != shape[1]) and (image_width != shape[1]):
+            raise ValueError('`image_shape` does not match the shape of the '
+                             'spectrum.')
+
+    radius_map, weights, n_bins, counts = _get_radius_map(shape,
+                                                          image_width)
+    frequencies = np.arange(n_bins) / min(shape[0], image_width)
+
+    amplitudes = amplitude.reshape(-1, radius_map.shape[0])
+    n_images = amplitudes.shape[0]
+    if weights is not None:
+        amplitudes = amplitudes * weights
+
+    # Assign a unique set of bins to each image, so all images can be
+    # processed in a single call to bincount.
+    labels = radius_map + (np.arange(n_images) * (n_bins + 1))[:, np.newaxis]
+    sums = np.bincount(labels.ravel(), weights=amplitudes.ravel(),
+                       minlength=n_images * (n_bins + 1))
+    means = sums.reshape(n_images, n_bins + 1)[:, :n_bins] / counts
+
+    if amplitude.ndim == 2:
+        means = means[0]
+
+    return _RadialSpectrum(frequencies, means)
+
+
+def spectral_slope(amplitude, image_shape=None, frequency_range=None):
+    """
+    Estimate the slope of the amplitude spectrum in log-log space.
+
+    The slope is estimated via a linear least-squares fit to the
+    logarithms of the radially averaged amplitude spectrum. Natural images
+    typically have a slope of about -1 (i.e., a 1/f amplitude spectrum).
+
+    Parameters
+    ----------
+    amplitude : array_like
+        The amplitude spectrum of a single image or a stack of images.
+        See `radial_amplitude_spectrum`.
+
+    image_shape : tuple of ints, optional
+        The shape of the original image(s).
+        See `radial_amplitude_spectrum`.
+
+    frequency_range : tuple of floats, optional
+        The lowest and highest frequency (in cycles per pixel) to include
+        in the fit. If ``None``, use all frequencies except for the zero
+        frequency.
+
+    Returns
+    -------
+    namedtuple
+        A namedtuple containing the slope and the intercept of the fit.
+        For a stack of images, these are arrays of length ``n_images``.
+
+    See Also
+    --------
+    radial_amplitude_spectrum
+
+    """
+    frequencies, amplitudes = radial_amplitude_spectrum(
+        amplitude, image_shape=image_shape
+    )
+
+    if frequency_range is None:
+        mask = frequencies > 0
+    else:
+        mask = ((frequencies > 0) &
+                (frequencies >= frequency_range[0]) &
+                (frequencies <= frequency_range[1]))
+
+    if mask.sum() < 2:
+        raise ValueError('At least two frequencies are required to fit the '
+                         'spectral slope.')
+
+    x = np.log10(frequencies[mask])
+    y = np.log10(amplitudes[..., mask])
+    slope, intercept = np.polyfit(x, y.T, 1)
+
+    return _SpectralSlope(slope, intercept)
+
+
+def _get_rfft2_plans(shape):
+    """
+    Return a forward and an inverse real-input FFTW plan for a batch of
+    images of the given shape.
+
+    Calling a plan returns its internal output array, which is overwritten
+    by the next call. Copy the input into the ``input_array`` of the plan
+    before calling it without arguments: when passed an array, the plan may
+    adopt it as its input array, and overwrite it on a later call.
+
+    """
+    key = (tuple(shape), _fftw_kwargs['planner_effort'],
+           _fftw_kwargs['threads'])
+
+    try:
+        plans = _rfft2_plans.pop(key)
+    except KeyError:
+        pyfftw = _get_pyfftw()
+        forward = pyfftw.builders.rfftn(np.empty(shape), axes=(-2, -1),
+                                        **_fftw_kwargs)
+        inverse = pyfftw.builders.irfftn(np.empty(forward.output_shape,
+                                                  dtype=forward.output_dtype),
+                                         s=shape[-2:], axes=(-2, -1),
+                                         **_fftw_kwargs)
+        plans = (forward, inverse)
+
+        if len(_rfft2_plans) >= _max_rfft2_plans:
+            _rfft2_plans.popitem(last=False)
+
+    # Move the plans to the end, i.e. mark them as most recently used.
+    _rfft2_plans[key] = plans
+    return plans
+
+
+def _as_image_stack(images):
+    images = np.asarray(images, dtype=np.float64)
+
+    if images.ndim == 2:
+        images = images[np.newaxis]
+    elif images.ndim != 3:
+        raise ValueError('`images` must be a two- or three-dimensional '
+                         'array.')
+
+    return images
+
+
+def _get_mean_amplitude(images, batch_size):
+    amplitude = 0
 
-    result = namedtuple('Image', 'FFT Amplitude Phase')
-    return result(image_fft, image_amplitude, image_phase)
+    for start in range(0, images.shape[0], batch_size):
+        batch = images[start:start + batch_size]
+        forward = _get_rfft2_plans(batch.shape)[0]
+        forward.input_array[:] = batch
+        amplitude = amplitude + np.abs(forward()).sum(axis=0)
+
+    return amplitude / images.shape[0]
+
+
+def match_amplitude_spectra(images, amplitude=None, batch_size=64):
+    """
+    Equalize the amplitude spectra of a set of images.
+
+    The amplitude spectrum of each image is replaced by the mean amplitude
+    spectrum of all images (or by a target spectrum), while the phase
+    spectra are retained. This is the spectrum matching procedure of the
+    SHINE toolbox.
+
+    Parameters
+    ----------
+    images : array_like
+        A stack of grayscale images of shape ``(n_images, height, width)``.
+
+    amplitude : array_like, optional
+        The target amplitude spectrum, as returned by
+        ``fft_image(image, use_rfft=True)``. If ``None``, use the mean
+        amplitude spectrum of `images`.
+
+    batch_size : int, optional
+        The number of images to transform at once. Larger batches can be
+        faster, but require more memory.
+        Defaults to 64.
+
+    Returns
+    -------
+    ndarray
+        The spectrum-matched images, in the same shape as the input.
+
+    See Also
+    --------
+    phase_scramble_images
+
+    """
+    images = _as_image_stack(images)
+
+    if amplitude is None:
+        amplitude = _get_mean_amplitude(images, batch_size)
+
+    result = np.empty_like(images)
+
+    for start in range(0, images.shape[0], batch_size):
+        stop = start + batch_size
+        forward, inverse = _get_rfft2_plans(images[start:stop].shape)
+        forward.input_array[:] = images[start:stop]
+        phase = np.angle(forward())
+        result[start:stop] = inverse(amplitude * np.exp(1j * phase))
+
+    return result
+
+
+def phase_scramble_images(images, n_variants=1, match_amplitude=False,
+                          seed=None, batch_size=64):
+    """
+    Create phase-scrambled versions of a set of images.
+
+    Random phases are added to the phase spectrum of each image, while
+    the amplitude spectrum is retained. The random phases are taken from
+    the spectrum of white noise, which ensures that the scrambled images
+    are real-valued. The mean luminance of each image is preserved.
+
+    The images are transformed in batches, and the same FFTW plans are
+    reused for all transforms, so this function is considerably faster than
+    scrambling the images one by one.
+
+    Parameters
+    ----------
+    images : array_like
+        A single grayscale image of shape ``(height, width)``, or a stack of
+        images of shape ``(n_images, height, width)``.
+
+    n_variants : int, optional
+        The number of scrambled versions to create per image.
+        Defaults to 1.
+
+    match_amplitude : bool, optional
+        Whether to additionally equalize the amplitude spectra of all
+        images. See `match_amplitude_spectra`.
+        Defaults to ``False``.
+
+    seed : int, optional
+        The seed of the random number generator. Pass a fixed value to
+        create reproducible stimuli.
+
+    batch_size : int, optional
+        The number of images to transform at once. Larger batches can be
+        faster, but require more memory. The result does not depend on
+        the batch size.
+        Defaults to 64.
+
+    Returns
+    -------
+    ndarray
+        The phase-scrambled images, of shape
+        ``(n_images, n_variants, height, width)``.
+
+    See Also
+    --------
+    match_amplitude_spectra
+
+    """
+    images = _as_image_stack(images)
+    random_state = np.random.RandomState(seed)
+
+    if match_amplitude:
+        mean_amplitude = _get_mean_amplitude(images, batch_size)
+
+    result = np.empty((images.shape[0], n_variants) + images.shape[1:])
+
+    for start in range(0, images.shape[0], batch_size):
+        stop = start + batch_size
+        batch = images[start:stop]
+        forward, inverse = _get_rfft2_plans(batch.shape)
+
+        forward.input_array[:] = batch
+        spectra = forward()
+        phase = np.angle(spectra)
+        if match_amplitude:
+            amplitude = mean_amplitude
+        else:
+            amplitude = np.abs(spectra)
+
+        # Draw the noise for all variants of an image in one go, so that
+        # the random numbers do not depend on the batch size.
+        noise = random_state.random_sample((batch.shape[0], n_variants) +
+                                           batch.shape[1:])
+
+        for variant in range(n_variants):
+            forward.input_array[:] = noise[:, variant]
+            random_phase = np.angle(forward())
+
+            # Keep the zero frequency, i.e. the mean luminance, unchanged.
+            random_phase[..., 0, 0] = 0
+
+            result[start:stop, variant] = inverse(
+                amplitude * np.exp(1j * (phase + random_phase)))
+
+    return result
+
+
+def read_image(filename, flatten=False):
+    """
+    Read an image from a file into an array.
+
+    This is a replacement for `scipy.misc.imread`, which has been removed
+    from SciPy.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the image file to load.
+
+    flatten : bool, optional
+        Whether to "flatten" the image, i.e. convert it to a
+        single-precision grayscale image.
+
+    Returns
+    -------
+    ndarray
+        The image.
+
+    """
+    from PIL import Image
+
+    image = Image.open(filename)
+
+    if flatten:
+        image = image.convert('F')
+    elif image.mode == '1':
+        image = image.convert('L')
+
+    return np.array(image)
+
+
+def _get_gaussian_transfer_function(shape, sigma):
+    """
+    Return the (real-input FFT) transfer function of a Gaussian kernel.
+
+    """
+    key = (tuple(shape), float(sigma))
+
+    try:
+        return _gaussian_transfer_functions[key]
+    except KeyError:
+        pass
+
+    freqs_y = np.fft.fftfreq(shape[0])[:, np.newaxis]
+    freqs_x = np.fft.rfftfreq(shape[1])[np.newaxis, :]
+    transfer_function = np.exp(-2 * np.pi**2 * sigma**2 *
+                               (freqs_y**2 + freqs_x**2))
+    transfer_function.setflags(write=False)
+
+    _gaussian_transfer_functions[key] = transfer_function
+    return transfer_function
+
+
+def lowpass_filter_images(images, sigma=3, batch_size=64):
+    """
+    Low-pass filter a stack of images via a Gaussian kernel in the
+    frequency domain.
+
+    The images are transformed using a real-input FFT, multiplied by the
+    transfer function of the Gaussian kernel, and transformed back. In
+    contrast to filtering in the spatial domain, the computational cost
+    does not depend on `sigma`.
+
+    Parameters
+    ----------
+    images : array_like
+        The images to process. Either a single grayscale image of shape
+        ``(height, width)``, or a stack of images of shape
+        ``(n_images, height, width)``.
+
+    sigma : scalar, optional
+        The standard deviation for Gaussian kernel, in pixels.
+
+    batch_size : int, optional
+        The number of images to transform at once. Larger batches can be
+        faster, but require more memory.
+        Defaults to 64.
+
+    Returns
+    -------
+    ndarray
+        The lowpass-filtered images, in the same shape as the input.
+        Single-precision input yields single-precision output; all other
+        input is processed in double precision.
+
+    Notes
+    -----
+    The FFT treats the images as periodic, i.e. the kernel wraps around
+    the image borders. This corresponds to ``mode='wrap'`` in
+    `scipy.ndimage.gaussian_filter`, while `lowpass_filter_image` by
+    default uses ``mode='reflect'``. Results therefore differ slightly
+    close to the image borders.
+
+    See Also
+    --------
+    lowpass_filter_image
+
+    """
+    images = np.asarray(images)
+    if images.dtype != np.float32:
+        images = images.astype(np.float64)
+
+    if images.ndim == 2:
+        return lowpass_filter_images(images[np.newaxis], sigma=sigma,
+                                     batch_size=batch_size)[0]
+    elif images.ndim != 3:
+        raise ValueError('`images` must be a two- or three-dimensional '
+                         'array.')
+
+    numpy_fft = _get_pyfftw().interfaces.numpy_fft
+    shape = images.shape[1:]
+    transfer_function = _get_gaussian_transfer_function(shape, sigma)
+    result = np.empty_like(images)
+
+    for start in range(0, images.shape[0], batch_size):
+        stop = start + batch_size
+        spectrum = numpy_fft.rfft2(images[start:stop], **_fftw_kwargs)
+        spectrum *= transfer_function
+        result[start:stop] = numpy_fft.irfft2(spectrum, s=shape,
+                                              **_fftw_kwargs)
+
+    return result
 
 
 def lowpass_filter_image(image=None, filename=None, flatten=False,
-                         sigma=3):
+                         sigma=3, method='spatial'):
     """
     Load an image from a file, and low-pass filter via a Gaussian kernel.
 
@@ -52,7 +838,7 @@ def lowpass_filter_image(image=None, filename=None, flatten=False,
     ----------
     image : ndarray, optional
         The image to be processed. This will usually have been created
-        using `scipy.misc.imread` or a similar function.
+        using `read_image` or a similar function.
         If this argument is present, `filename` will be ignored.
 
     filename : string, optional
@@ -67,6 +853,14 @@ def lowpass_filter_image(image=None, filename=None, flatten=False,
         The standard deviation for Gaussian kernel.
         See `scipy.ndimage.filters.gaussian_filter`.
 
+    method : string, optional
+        If ``spatial``, convolve the image with the Gaussian kernel using
+        `scipy.ndimage.gaussian_filter`. If ``fft``, filter in the frequency
+        domain using `lowpass_filter_images`, which is considerably faster
+        for large images and large values of `sigma`. Color images are then
+        filtered channel by channel.
+        Defaults to ``spatial``.
+
     Returns
     -------
     ndarray
@@ -74,6 +868,7 @@ def lowpass_filter_image(image=None, filename=None, flatten=False,
 
     See Also
     --------
+    lowpass_filter_images
     scipy.ndimage.gaussian_filter
 
     """
@@ -82,6 +877,223 @@ def lowpass_filter_image(image=None, filename=None, flatten=False,
                              'image filename in lowpass_filter_image().')
 
     if image is None:
-        image = imread(filename, flatten=flatten)
+        image = read_image(filename, flatten=flatten)
+
+    if method == 'spatial':
+        from scipy import ndimage
+        return ndimage.gaussian_filter(image, sigma)
+    elif method == 'fft':
+        image = np.asarray(image)
+        if image.ndim == 3:
+            # Color image: filter each channel separately.
+            channels = np.rollaxis(image, -1)
+            return np.rollaxis(lowpass_filter_images(channels, sigma), 0, 3)
+        else:
+            return lowpass_filter_images(image, sigma)
+    else:
+        raise ValueError('`method` must be one of: spatial, fft.')
+
+
+_image_file_extensions = ('.bmp', '.gif', '.jpeg', '.jpg', '.png', '.tif',
+                          '.tiff')
+
+
+def iter_image_files(directory, extensions=_image_file_extensions):
+    """
+    Lazily iterate over the image files in a directory.
+
+    Parameters
+    ----------
+    directory : string
+        The directory to search. Subdirectories are not searched.
+
+    extensions : sequence of strings, optional
+        Only files with one of these (case-insensitive) extensions will be
+        returned.
+
+    Yields
+    ------
+    string
+        The path of an image file.
+
+    """
+    for filename in os.listdir(directory):
+        if os.path.splitext(filename)[1].lower() in extensions:
+            yield os.path.join(directory, filename)
+
+
+def _preprocess_image_file(filename, output_directory, outputs, flatten,
+                           sigma, method, use_rfft):
+    """
+    Process a single image file and save the results; executed by the
+    worker processes of `preprocess_images`.
+
+    """
+    image = read_image(filename, flatten=flatten)
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    output_filenames = dict()
+
+    def save(output, data):
+        output_filename = os.path.join(output_directory,
+                                       '%s_%s.npy' % (basename, output))
+        np.save(output_filename, data)
+        output_filenames[output] = output_filename
+
+    if 'filtered' in outputs:
+        save('filtered', lowpass_filter_image(image, sigma=sigma,
+                                              method=method))
+
+    if ('amplitude' in outputs) or ('phase' in outputs):
+        result = fft_image(image, use_rfft=use_rfft, return_fft=False,
+                           return_amplitude='amplitude' in outputs,
+                           return_phase='phase' in outputs)
+        if result.Amplitude is not None:
+            save('amplitude', result.Amplitude)
+        if result.Phase is not None:
+            save('phase', result.Phase)
+
+    return filename, output_filenames
+
+
+def _initialize_worker(fftw_kwargs, cache_keepalive, wisdom):
+    """
+    Apply the FFTW configuration and wisdom of the parent process to a
+    worker process of `preprocess_images`.
+
+    Worker processes that are spawned instead of forked (the default on
+    Windows and macOS) start with the module defaults otherwise.
+
+    """
+    global _cache_keepalive
+
+    _fftw_kwargs.update(fftw_kwargs)
+    _cache_keepalive = cache_keepalive
+
+    if wisdom is not None:
+        _get_pyfftw().import_wisdom(wisdom)
+
+
+def preprocess_images(images, output_directory,
+                      outputs=('filtered', 'amplitude', 'phase'),
+                      flatten=True, sigma=3, method='fft', use_rfft=False,
+                      n_jobs=None, max_in_flight=None):
+    """
+    Low-pass filter and Fourier-transform a set of image files, and save
+    the results to disk.
+
+    The images are read, processed, and saved by a pool of worker
+    processes. Only a limited number of images is processed at any time,
+    so memory usage stays bounded no matter how many images there are.
+
+    Parameters
+    ----------
+    images : string, path-like, or iterable of strings
+        Either a directory containing the images to process (see
+        `iter_image_files`), or an iterable of image file names. Iterables
+        are consumed lazily.
+
+    output_directory : string
+        The directory to save the results to. Will be created if it does
+        not exist. For an input file ``foo.png``, the results will be
+        stored as ``foo_filtered.npy``, ``foo_amplitude.npy``, and
+        ``foo_phase.npy``.
+
+    outputs : sequence of strings, optional
+        Which results to save. May contain ``filtered`` (the low-pass
+        filtered image), ``amplitude``, and ``phase`` (the amplitude and
+        phase spectra of the unfiltered image).
+        Defaults to all three.
+
+    flatten : bool, optional
+        Whether to "flatten" the images before processing, i.e. convert
+        them to grayscale.
+        Defaults to ``True``.
+
+    sigma : scalar, optional
+        The standard deviation for Gaussian kernel.
+        See `lowpass_filter_image`.
+
+    method : string, optional
+        The filtering method, either ``spatial`` or ``fft``.
+        See `lowpass_filter_image`. Defaults to ``fft``.
+
+    use_rfft : bool, optional
+        Whether to use a real-input FFT to calculate the spectra.
+        See `fft_image`. Defaults to ``False``.
+
+    n_jobs : int, optional
+        The number of worker processes to use. If ``1``, process all images
+        in the current process. If ``None``, use as many processes as there
+        are CPUs. The worker processes use the settings made via
+        `configure_fftw`, and the FFTW wisdom of the current process.
+
+    max_in_flight : int, optional
+        The maximum number of images being processed at the same time.
+        If ``None``, use twice the number of worker processes.
+
+    Returns
+    -------
+    list of tuples
+        One ``(filename, output_filenames)`` tuple per processed image, in
+        the order of completion. ``output_filenames`` is a dictionary
+        mapping the requested outputs to the names of the created files.
+
+    See Also
+    --------
+    lowpass_filter_image, fft_image, iter_image_files
+
+    """
+    unknown_outputs = set(outputs) - set(['filtered', 'amplitude', 'phase'])
+    if unknown_outputs:
+        raise ValueError('Unknown outputs: %s. `outputs` may only contain: '
+                         'filtered, amplitude, phase.'
+                         % ', '.join(sorted(unknown_outputs)))
+
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    # Directories may be specified as strings or path-like objects, e.g.
+    # `pathlib.Path`.
+    if isinstance(images, (str, bytes)) or hasattr(images, '__fspath__'):
+        if not os.path.isdir(images):
+            raise ValueError('%s is not a directory.' % images)
+        filenames = iter_image_files(images)
+    else:
+        filenames = iter(images)
+
+    process = functools.partial(_preprocess_image_file,
+                                output_directory=output_directory,
+                                outputs=tuple(outputs), flatten=flatten,
+                                sigma=sigma, method=method,
+                                use_rfft=use_rfft)
+
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+
+    if n_jobs == 1:
+        return [process(filename) for filename in filenames]
+
+    if max_in_flight is None:
+        max_in_flight = 2 * n_jobs
+
+    # Wisdom only exists if pyfftw has been used in this process already.
+    wisdom = _pyfftw.export_wisdom() if _pyfftw is not None else None
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_initialize_worker,
+            initargs=(dict(_fftw_kwargs), _cache_keepalive, wisdom)) as pool:
+        pending = set()
+        for filename in filenames:
+            if len(pending) >= max_in_flight:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                results.extend(future.result() for future in done)
+
+            pending.add(pool.submit(process, filename))
+
+        for future in concurrent.futures.as_completed(pending):
+            results.append(future.result())
 
-    return ndimage.gaussian_filter(image, sigma)
+    return results
@@ -9,13 +9,13 @@ pp. 291-302.
 """
 
 from __future__ import division, unicode_literals
-import pandas as pd
 import numpy as np
 import warnings
-from scipy.stats import rankdata
-from scipy.interpolate import interp1d
 from . import utils
 
+# scipy.stats and scipy.interpolate are slow to import, so they are only
+# imported by the functions requiring them.
+
 
 def gen_cdf(rts, t_max=None):
     """
@@ -91,6 +91,8 @@ def gen_cdf(rts, t_max=None):
     Length: 281, dtype: float64
 
     """
+    # pandas is slow to import, so only import it when required.
+    import pandas as pd
 
     # Convert input data to a Series, and round to 1 ms
     rts = pd.Series(rts).round().astype('int')
@@ -112,6 +114,9 @@ def gen_cdf(rts, t_max=None):
     # with the 'maximum' method (i.e. in the case of ties, all ties
     # will receive the highest possible rank), select all unique ranks,
     # and use these to calculate the plotting positions.
+    from scipy.stats import rankdata
+    from scipy.interpolate import interp1d
+
     rts_sorted = rts.sort_values(inplace=False)
     p = np.unique(rankdata(rts_sorted, method='max')) / len(rts_sorted)
 
@@ -265,6 +270,8 @@ def gen_cdfs_from_list(data, t_max=None, names=None,
     [292 rows x 2 columns]
 
     """
+    # pandas is slow to import, so only import it when required.
+    import pandas as pd
 
     if t_max is None:
         t_max = utils.get_max_from_list(data)
@@ -525,6 +532,9 @@ def get_percentiles_from_cdf(cdf, p=None, num_p=10, time_index='t'):
     dtype: float64
 
     """
+    # pandas is slow to import, so only import it when required.
+    import pandas as pd
+
     if p is None:
         p = gen_percentiles(num_p)
 
@@ -592,6 +602,11 @@ def gen_step_fun(rts):
     >>> plt.step(sf, sf.index, where='post'); plt.show()
 
     """
+    # pandas and SciPy are slow to import, so only import them when
+    # required.
+    import pandas as pd
+    from scipy.stats import rankdata
+
     rts_unique = np.unique(rts)
     rts_sorted = np.sort(rts)
     p = np.unique(rankdata(rts_sorted, method='max')) / len(rts_sorted)
@@ -673,6 +688,9 @@ def sum_cdfs(cdfs):
     Length: 292, dtype: float64
 
     """
+    # pandas is slow to import, so only import it when required.
+    import pandas as pd
+
     cdf_lengths_equal = all([cdf.shape == cdfs[0].shape for cdf in cdfs])
     if not cdf_lengths_equal:
         raise ValueError('Please supply CDFs with equal lengths.')
@@ -6,9 +6,11 @@ Signal detection theory calculations.
 """
 
 from __future__ import division, unicode_literals
-from scipy.stats import norm
 import numpy as np
 
+# scipy.stats is slow to import, so it is only imported by the functions
+# requiring it.
+
 
 def d_prime(hits, false_alarms, n, nafc=1):
     """
@@ -42,6 +44,8 @@ def d_prime(hits, false_alarms, n, nafc=1):
     if nafc != 1:
         raise NotImplementedError('Only 1-AFC implemented so far.')
 
+    from scipy.stats import norm
+
     hit_rate, fa_rate = _calculate_hit_and_fa_rates(hits, false_alarms, n)
     d = norm.ppf(hit_rate) - norm.ppf(fa_rate)
     return d
@@ -123,6 +127,8 @@ def criterion(hits, false_alarms, n, nafc=1):
     if nafc != 1:
         raise NotImplementedError('Only 1-AFC implemented so far.')
 
+    from scipy.stats import norm
+
     hit_rate, fa_rate = _calculate_hit_and_fa_rates(hits, false_alarms, n)
     C = -0.5 * (norm.ppf(hit_rate) + norm.ppf(fa_rate))
     return C
@@ -1,22 +1,38 @@
 # -*- coding: utf-8 -*-
 
-from pphelper.image import lowpass_filter_image, fft_image
+from pphelper.image import (lowpass_filter_image, lowpass_filter_images,
+                            fft_image, configure_fftw, export_wisdom,
+                            import_wisdom, read_image, preprocess_images,
+                            fft_images_to_npy, radial_amplitude_spectrum,
+                            spectral_slope, match_amplitude_spectra,
+                            phase_scramble_images)
+from scipy import ndimage
 import numpy as np
+import pytest
 import pyfftw
 import pickle
+import pathlib
+import pphelper.image
 
 data_directory = 'pphelper/tests/data/'
 
 
-# def test_lowpass_filter_image():
-#     result = lowpass_filter_image(filename=data_directory + 'tux.png',
-#                                   flatten=True)
-#     result_expected = np.load(
-#         data_directory + 'tux_flattened_lowpass_filtered_sigma_3.npy'
-#     )
-#     assert np.array_equal(result, result_expected)
-#
-#
+def test_lowpass_filter_image():
+    result = lowpass_filter_image(filename=data_directory + 'tux.png',
+                                  flatten=True)
+    result_expected = np.load(
+        data_directory + 'tux_flattened_lowpass_filtered_sigma_3.npy'
+    )
+    assert np.array_equal(result, result_expected)
+
+
+def test_read_image_flatten():
+    result = read_image(data_directory + 'tux.png', flatten=True)
+    result_expected = np.load(data_directory + 'tux_flattened.npy')
+    assert result.dtype == np.float32
+    assert np.array_equal(result, result_expected)
+
+
 # def test_fft_image():
 #     image = np.load(data_directory + 'tux_flattened.npy')
 #
@@ -35,6 +51,279 @@ data_directory = 'pphelper/tests/data/'
 #     assert np.allclose(phase, phase_expected)
 
 
+def test_fft_image_rfft():
+    image = np.load(data_directory + 'tux_flattened.npy')
+    n_cols = image.shape[1] // 2 + 1
+
+    full = fft_image(image)
+    real = fft_image(image, use_rfft=True)
+
+    assert real.FFT.shape == (image.shape[0], n_cols)
+    assert np.allclose(real.FFT, full.FFT[:, :n_cols], rtol=1e-4,
+                       atol=10)
+    assert np.allclose(real.Amplitude, full.Amplitude[:, :n_cols],
+                       rtol=1e-4, atol=10)
+
+
+def test_fft_image_select_outputs():
+    image = np.load(data_directory + 'tux_flattened.npy')
+
+    result = fft_image(image, use_rfft=True, return_fft=False,
+                       return_phase=False)
+
+    assert result.FFT is None
+    assert result.Phase is None
+    assert np.allclose(result.Amplitude, np.abs(np.fft.rfft2(image)),
+                       rtol=1e-4, atol=10)
+
+
+def test_lowpass_filter_image_fft():
+    image = np.load(data_directory + 'tux_flattened.npy').astype(np.float64)
+
+    result = lowpass_filter_image(image, sigma=3, method='fft')
+    result_expected = ndimage.gaussian_filter(image, 3, mode='wrap')
+
+    assert result.shape == image.shape
+    assert np.allclose(result, result_expected, atol=0.5)
+
+
+def test_lowpass_filter_images_stack():
+    image = np.load(data_directory + 'tux_flattened.npy')
+    images = np.array([image, image[::-1], image[:, ::-1]])
+
+    result = lowpass_filter_images(images, sigma=5, batch_size=2)
+
+    assert result.shape == images.shape
+    assert result.dtype == np.float32
+    for filtered, original in zip(result, images):
+        assert np.allclose(filtered, lowpass_filter_images(original, 5),
+                           atol=1e-3)
+
+
+def test_fft_images_to_npy(tmpdir):
+    image = np.load(data_directory + 'tux_flattened.npy')
+    images = (image for _ in range(3))
+    amplitude_filename = str(tmpdir.join('amplitude.npy'))
+    phase_filename = str(tmpdir.join('phase.npy'))
+
+    fft, amplitude, phase = fft_images_to_npy(
+        images, amplitude_filename=amplitude_filename,
+        phase_filename=phase_filename, n_images=3
+    )
+
+    assert fft is None
+    assert amplitude.shape == (3,) + image.shape
+    assert phase.shape == (3,) + image.shape
+
+    result_expected = fft_image(image)
+    amplitude = np.load(amplitude_filename, mmap_mode='r')
+    phase = np.load(phase_filename, mmap_mode='r')
+    for i in range(3):
+        assert np.array_equal(amplitude[i], result_expected.Amplitude)
+        assert np.array_equal(phase[i], result_expected.Phase)
+
+
+def test_fft_images_to_npy_wrong_n_images(tmpdir):
+    images = np.zeros((2, 4, 4))
+    filename = str(tmpdir.join('fft.npy'))
+
+    with pytest.raises(ValueError):
+        fft_images_to_npy(iter(images), fft_filename=filename, n_images=3)
+
+    with pytest.raises(TypeError):
+        fft_images_to_npy(iter(images), fft_filename=filename)
+
+
+def test_radial_amplitude_spectrum():
+    amplitude = np.random.random_sample((3, 20, 30))
+
+    frequencies, result = radial_amplitude_spectrum(amplitude)
+
+    freqs_y = np.fft.fftfreq(20)[:, np.newaxis]
+    freqs_x = np.fft.fftfreq(30)[np.newaxis, :]
+    radius = np.rint(np.hypot(freqs_y, freqs_x) * 20)
+
+    assert result.shape == (3, 11)
+    assert np.allclose(frequencies, np.arange(11) / 20)
+    for r in range(11):
+        result_expected = amplitude[:, radius == r].mean(axis=1)
+        assert np.allclose(result[:, r], result_expected)
+
+
+def test_radial_amplitude_spectrum_rfft():
+    image = np.load(data_directory + 'tux_flattened.npy')
+
+    full = radial_amplitude_spectrum(fft_image(image).Amplitude)
+    real = radial_amplitude_spectrum(
+        fft_image(image, use_rfft=True).Amplitude, image_shape=image.shape
+    )
+
+    assert np.array_equal(full.Frequency, real.Frequency)
+    assert np.allclose(full.Amplitude, real.Amplitude, rtol=1e-4)
+
+
+def test_spectral_slope():
+    freqs_y = np.fft.fftfreq(64)[:, np.newaxis]
+    freqs_x = np.fft.fftfreq(64)[np.newaxis, :]
+    radius = np.hypot(freqs_y, freqs_x)
+    radius[0, 0] = 1
+    amplitude = np.array([radius ** -1, 10 * radius ** -2])
+
+    slope, intercept = spectral_slope(amplitude)
+
+    assert np.allclose(slope, [-1, -2], atol=0.05)
+    assert np.allclose(intercept, [0, 1], atol=0.1)
+
+
+def test_match_amplitude_spectra():
+    image = np.load(data_directory + 'tux_flattened.npy').astype(np.float64)
+    images = np.array([image, image[::-1, ::-1] ** 2 / 255])
+
+    result = match_amplitude_spectra(images)
+    amplitude = np.abs(np.fft.rfft2(result))
+    amplitude_expected = np.abs(np.fft.rfft2(images)).mean(axis=0)
+
+    assert result.shape == images.shape
+    assert np.allclose(amplitude[0], amplitude_expected)
+    assert np.allclose(amplitude[1], amplitude_expected)
+
+
+def test_phase_scramble_images():
+    image = np.load(data_directory + 'tux_flattened.npy').astype(np.float64)
+    images = np.array([image, image[::-1]])
+
+    result = phase_scramble_images(images, n_variants=3, seed=42)
+
+    assert result.shape == (2, 3) + image.shape
+    amplitude_expected = np.abs(np.fft.rfft2(images))
+    for variant in range(3):
+        scrambled = result[:, variant]
+        assert not np.allclose(scrambled, images)
+        assert np.allclose(scrambled.mean(axis=(1, 2)),
+                           images.mean(axis=(1, 2)))
+        assert np.allclose(np.abs(np.fft.rfft2(scrambled)),
+                           amplitude_expected)
+
+    assert not np.allclose(result[:, 0], result[:, 1])
+    assert np.array_equal(result,
+                          phase_scramble_images(images, n_variants=3,
+                                                seed=42))
+
+
+def test_spectra_batch_size():
+    image = np.load(data_directory + 'tux_flattened.npy').astype(np.float64)
+    images = np.array([image, image[::-1], image[:, ::-1]])
+    original = images.copy()
+
+    assert np.allclose(match_amplitude_spectra(images, batch_size=2),
+                       match_amplitude_spectra(images))
+    for match_amplitude in (False, True):
+        assert np.allclose(
+            phase_scramble_images(images, n_variants=2, seed=42,
+                                  match_amplitude=match_amplitude,
+                                  batch_size=2),
+            phase_scramble_images(images, n_variants=2, seed=42,
+                                  match_amplitude=match_amplitude))
+    assert np.array_equal(images, original)
+
+    # Only the plans of the most recently used batch shapes are kept.
+    for n_images in range(1, 8):
+        match_amplitude_spectra(np.zeros((n_images, 8, 8)))
+    assert len(pphelper.image._rfft2_plans) == \
+        pphelper.image._max_rfft2_plans
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_preprocess_images(tmpdir, n_jobs):
+    output_directory = str(tmpdir.join('output'))
+    filenames = [data_directory + 'tux.png'] * 3
+
+    results = preprocess_images(filenames, output_directory, sigma=3,
+                                method='spatial', n_jobs=n_jobs,
+                                max_in_flight=2)
+
+    assert len(results) == 3
+    filename, output_filenames = results[0]
+    assert filename == data_directory + 'tux.png'
+    assert sorted(output_filenames) == ['amplitude', 'filtered', 'phase']
+
+    filtered = np.load(output_filenames['filtered'])
+    filtered_expected = np.load(
+        data_directory + 'tux_flattened_lowpass_filtered_sigma_3.npy'
+    )
+    assert np.array_equal(filtered, filtered_expected)
+
+
+def test_preprocess_images_directory(tmpdir):
+    output_directory = str(tmpdir.join('output'))
+
+    results = preprocess_images(data_directory, output_directory,
+                                outputs=['amplitude'], use_rfft=True,
+                                n_jobs=1)
+
+    assert len(results) == 1
+    filename, output_filenames = results[0]
+    assert list(output_filenames) == ['amplitude']
+    assert np.load(output_filenames['amplitude']).shape == (314, 133)
+
+
+def test_preprocess_images_path(tmpdir):
+    output_directory = str(tmpdir.join('output'))
+
+    results = preprocess_images(pathlib.Path(data_directory),
+                                output_directory, outputs=['amplitude'],
+                                n_jobs=1)
+    assert len(results) == 1
+
+    with pytest.raises(ValueError):
+        preprocess_images(data_directory + 'tux.png', output_directory)
+
+
+def test_preprocess_images_worker_configuration():
+    fftw_kwargs = dict(pphelper.image._fftw_kwargs)
+    cache_keepalive = pphelper.image._cache_keepalive
+    wisdom = pyfftw.export_wisdom()
+
+    try:
+        pphelper.image._initialize_worker(
+            dict(planner_effort='FFTW_MEASURE', threads=2), 30, wisdom)
+        assert pphelper.image._fftw_kwargs == dict(
+            planner_effort='FFTW_MEASURE', threads=2)
+        assert pphelper.image._cache_keepalive == 30
+    finally:
+        pphelper.image._fftw_kwargs.update(fftw_kwargs)
+        pphelper.image._cache_keepalive = cache_keepalive
+
+
+def test_wisdom_roundtrip(tmpdir):
+    image = np.load(data_directory + 'tux_flattened.npy')
+    filename = str(tmpdir.join('wisdom.pickle'))
+
+    configure_fftw(planner_effort='measure')
+    try:
+        fft_image(image)
+        export_wisdom(filename)
+        result = import_wisdom(filename)
+    finally:
+        configure_fftw(planner_effort='estimate')
+
+    assert len(result) == 3
+    assert all(result)
+
+
+def test_import_wisdom_python2_pickle():
+    result = import_wisdom(data_directory + 'fftw3-wisdom.pickle')
+    assert len(result) == 3
+
+
+def test_configure_fftw_invalid():
+    with pytest.raises(ValueError):
+        configure_fftw(planner_effort='foobar')
+
+    with pytest.raises(ValueError):
+        configure_fftw(threads=0)
+
+
 if __name__ == '__main__':
     import pytest
     pytest.main()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import pytest
+
+
+def _get_loaded_modules(statement):
+    code = ('import sys; %s; print(" ".join(sorted(sys.modules)))'
+            % statement)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return output.decode('ascii').split()
+
+
+def test_import_pphelper_is_lazy():
+    modules = _get_loaded_modules('import pphelper')
+    for submodule in ['racemodel', 'hardware', 'image', 'sdt', 'utils']:
+        assert 'pphelper.' + submodule not in modules
+
+
+def test_submodule_attribute_access():
+    import pphelper
+    assert pphelper.utils.find_nearest is not None
+
+    with pytest.raises(AttributeError):
+        pphelper.foobar
+
+
+@pytest.mark.parametrize('module, dependencies', [
+    ('image', ['pyfftw', 'scipy.ndimage', 'PIL']),
+    ('hardware', ['nidaqmx', 'psychopy']),
+    ('racemodel', ['pandas', 'scipy.stats', 'scipy.interpolate']),
+    ('sdt', ['scipy.stats']),
+    ('utils', ['pandas'])
+])
+def test_import_defers_dependencies(module, dependencies):
+    modules = _get_loaded_modules('import pphelper.' + module)
+    assert 'pphelper.' + module in modules
+    for dependency in dependencies:
+        assert dependency not in modules
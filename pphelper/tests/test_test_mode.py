@@ -2,8 +2,17 @@
 
 from __future__ import division
 
+import concurrent.futures
+import json
 import pytest
-from pphelper.hardware import (Gustometer, Olfactometer, Trigger)
+import threading
+import time
+import timeit
+import numpy as np
+import pphelper.hardware
+from pphelper.hardware import (Gustometer, Olfactometer, Trigger,
+                               AnalogInput, Scheduler, ScheduledEvent,
+                               DataRecorder, load_recording, _RingBuffer)
 
 
 class TestGustometer():
@@ -67,3 +76,832 @@ class TestTrigger():
         self.t.add_stimulus('Onset', 128)
         self.t.select_stimulus('Onset')
         self.t.stimulate()
+
+
+class TestWorkerThread():
+    def test_stimulate_returns_future(self):
+        o = Olfactometer(use_threads=True, test_mode=True)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.01)
+        o.select_stimulus('Smell')
+
+        worker = o._worker
+        futures = [o.stimulate() for _ in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+
+        assert o._worker is worker
+        assert o.stimulus['name'] == 'Smell'
+
+    def test_blocking_wait(self):
+        o = Olfactometer(use_threads=True, test_mode=True)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.01)
+        o.select_stimulus('Smell')
+        assert o.stimulate(blocking_wait=True).done()
+
+    def test_error_reporting(self):
+        o = Olfactometer(use_threads=True, test_mode=True)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.001)
+        o.select_stimulus('Smell')
+        o._ni_task.write = lambda *args, **kwargs: 0
+
+        with pytest.warns(RuntimeWarning):
+            future = o.stimulate()
+            concurrent.futures.wait([future])
+        assert isinstance(future.exception(), IOError)
+
+        # The failure is reported by the next stimulation, which is then
+        # not carried out.
+        with pytest.raises(IOError):
+            o.stimulate()
+        assert o._worker_error is None
+
+    def test_error_reporting_blocking_wait(self):
+        o = Olfactometer(use_threads=True, test_mode=True)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.001)
+        o.select_stimulus('Smell')
+        o._ni_task.write = lambda *args, **kwargs: 0
+
+        with pytest.raises(IOError):
+            o.stimulate(blocking_wait=True)
+        assert o._worker_error is None
+
+    def test_without_threads(self):
+        o = Olfactometer(use_threads=False, test_mode=True)
+        assert o._worker is None
+
+        with pytest.raises(ValueError):
+            o.stimulate()
+
+
+class TestStimulusRegistry():
+    def setup_method(self):
+        self.o = Olfactometer(use_threads=False, test_mode=True)
+        for i in range(8):
+            bitmask = [0] * 8
+            bitmask[i] = 1
+            self.o.add_stimulus('Smell %d' % i, bitmask=bitmask)
+
+    def test_stimuli_order(self):
+        names = [stimulus['name'] for stimulus in self.o.stimuli]
+        assert names == ['Smell %d' % i for i in range(8)]
+
+    def test_select_stimulus(self):
+        self.o.select_stimulus('Smell 3')
+        assert self.o.stimulus['name'] == 'Smell 3'
+        assert list(self.o.stimulus['bitmask']) == [0, 0, 0, 1, 0, 0, 0, 0]
+
+        with pytest.raises(ValueError):
+            self.o.stimulus['bitmask'][0] = 1
+
+        with pytest.raises(KeyError):
+            self.o.select_stimulus('foobar')
+
+    def test_replace_stimulus(self):
+        with pytest.raises(KeyError):
+            self.o.add_stimulus('Smell 3', bitmask=[1] * 8)
+
+        self.o.add_stimulus('Smell 3', bitmask=[1] * 8, replace=True)
+        self.o.select_stimulus('Smell 3')
+        assert list(self.o.stimulus['bitmask']) == [1] * 8
+        assert self.o.stimuli[-1]['name'] == 'Smell 3'
+
+    def test_remove_stimulus(self):
+        self.o.remove_stimulus('Smell 3')
+        assert len(self.o.stimuli) == 7
+
+        with pytest.raises(KeyError):
+            self.o.select_stimulus('Smell 3')
+
+        with pytest.raises(KeyError):
+            self.o.remove_stimulus('Smell 3')
+
+        del self.o.stimuli
+        assert self.o.stimuli == []
+
+
+class TestScheduler():
+    def test_wait_until(self):
+        s = Scheduler()
+        t = s.get_time() + 0.01
+        event = s.wait_until(t)
+
+        assert isinstance(event, ScheduledEvent)
+        assert event.scheduled == pytest.approx(t)
+        assert event.onset >= t
+        assert event.lateness == pytest.approx(event.onset - t)
+        assert list(s.events) == [event]
+
+    def test_wait_until_past(self):
+        s = Scheduler()
+        t = s.get_time() - 1
+        event = s.wait_until(t)
+        assert event.lateness >= 1
+
+    def test_wait_until_none(self):
+        s = Scheduler()
+        event = s.wait_until(None)
+        assert event.scheduled == event.onset
+        assert event.lateness == 0
+
+    def test_wait(self):
+        s = Scheduler()
+        start = timeit.default_timer()
+        s.wait(0.01)
+        assert timeit.default_timer() - start >= 0.01
+        assert len(s.events) == 0
+
+    def test_spin_window(self, monkeypatch):
+        assert (Scheduler().spin_window ==
+                pphelper.hardware._default_spin_window)
+        assert Scheduler(spin_window=0.005).spin_window == 0.005
+
+        with pytest.raises(ValueError):
+            Scheduler(spin_window=-1)
+
+        # Spinning through the entire interval never sleeps.
+        def sleep(duration):
+            raise AssertionError('Slept although spinning was requested.')
+
+        s = Scheduler(spin_window=float('inf'))
+        monkeypatch.setattr(pphelper.hardware, '_sleep', sleep)
+        event = s.wait_until(s.get_time() + 0.01)
+        assert event.lateness >= 0
+
+    def test_timebase(self):
+        s = Scheduler(timebase=lambda: timeit.default_timer() + 100)
+        assert s.get_time() == pytest.approx(timeit.default_timer() + 100,
+                                             abs=0.001)
+
+    def test_max_events(self):
+        s = Scheduler(max_events=2)
+        for _ in range(3):
+            s.wait_until(None)
+        assert len(s.events) == 2
+
+    def test_stimulate_returns_onset(self):
+        o = Olfactometer(use_threads=False, test_mode=True)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.001,
+                       trigger_time=o.scheduler.get_time() + 0.01)
+        o.select_stimulus('Smell')
+        event = o.stimulate()
+
+        assert isinstance(event, ScheduledEvent)
+        assert event.onset >= event.scheduled
+        assert list(o.scheduler.events) == [event]
+
+    def test_shared_scheduler(self):
+        s = Scheduler()
+        o = Olfactometer(use_threads=True, test_mode=True, scheduler=s)
+        t = Trigger(use_threads=False, test_mode=True, scheduler=s)
+        assert o.scheduler is s
+        assert t.scheduler is s
+
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.001)
+        o.select_stimulus('Smell')
+        event = o.stimulate(blocking_wait=True).result()
+        assert isinstance(event, ScheduledEvent)
+        assert len(s.events) == 1
+
+
+class TestHardwareTiming():
+    def test_Olfactometer_software_timed(self):
+        o = Olfactometer(use_threads=False, test_mode=True)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 1],
+                       duration=0.001)
+        o.select_stimulus('Smell')
+        o.stimulate()
+
+        written = o._ni_task.written
+        assert len(written) == 2
+        assert written[0].tolist() == [[1, 0, 0, 0, 0, 0, 0, 1, 1]]
+        assert written[1].tolist() == [[0] * 9]
+        assert o._ni_task.sample_clock is None
+
+    def test_Olfactometer_hardware_timed(self):
+        o = Olfactometer(use_threads=False, test_mode=True,
+                         hardware_timed=True, sample_rate=1000,
+                         ni_trigger_duration=0.002)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 1],
+                       bitmask_offset=[0, 1, 0, 0, 0, 0, 0, 0],
+                       duration=0.01)
+        o.select_stimulus('Smell')
+        o.stimulate()
+
+        written = o._ni_task.written
+        assert len(written) == 1
+
+        waveform = written[0]
+        assert waveform.shape == (11, 9)
+        assert (waveform[:10, :8] == [1, 0, 0, 0, 0, 0, 0, 1]).all()
+        assert waveform[10].tolist() == [0, 1, 0, 0, 0, 0, 0, 0, 0]
+        assert waveform[:, 8].tolist() == [1, 1] + [0] * 9
+        assert o._ni_task.sample_clock == dict(rate=1000,
+                                               sample_mode='finite',
+                                               samples_per_channel=11)
+        assert not o.stimulus['_ni_waveform'].flags.writeable
+
+    def test_Olfactometer_hardware_timed_trigger_entire_duration(self):
+        o = Olfactometer(use_threads=True, test_mode=True,
+                         hardware_timed=True, sample_rate=1000)
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.005)
+        o.select_stimulus('Smell')
+        o.stimulate(blocking_wait=True)
+
+        waveform = o._ni_task.written[0]
+        assert waveform[:, 8].tolist() == [1] * 5 + [0]
+
+    def test_Trigger_hardware_timed(self):
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True,
+                    sample_rate=10000)
+        t.add_trigger('Onset', 5, duration=0.001)
+        t.select_trigger('Onset')
+        event = t.trigger()
+
+        assert isinstance(event, ScheduledEvent)
+        waveform = t._ni_task.written[0]
+        assert waveform.shape == (11, 8)
+        assert (waveform[:10] == [1, 0, 1, 0, 0, 0, 0, 0]).all()
+        assert (waveform[10] == 0).all()
+
+    @pytest.mark.parametrize('use_threads', [False, True])
+    def test_hardware_timed_setup_before_trigger_time(self, use_threads):
+        o = Olfactometer(use_threads=use_threads, test_mode=True,
+                         hardware_timed=True, sample_rate=1000)
+        task = o._ni_task
+        calls = []
+
+        def write(*args, **kwargs):
+            calls.append(('write', o.scheduler.get_time(), kwargs))
+            return 1
+
+        def start():
+            calls.append(('start', o.scheduler.get_time(), None))
+            return True
+
+        task.write = write
+        task.start = start
+
+        trigger_time = o.scheduler.get_time() + 0.02
+        o.add_stimulus('Smell', bitmask=[1, 0, 0, 0, 0, 0, 0, 0],
+                       duration=0.5, trigger_time=trigger_time)
+        o.select_stimulus('Smell')
+
+        start_time = timeit.default_timer()
+        onset = o.stimulate(blocking_wait=True)
+        if use_threads:
+            onset = onset.result()
+
+        # The stimulation returns once the generation has started, and does
+        # not wait for the 500 ms stimulus to end.
+        assert timeit.default_timer() - start_time < 0.4
+        assert o._waveform_running
+
+        (_, write_time, write_kwargs), (_, start_time, _) = calls
+        assert write_kwargs['auto_start'] is False
+        assert write_time < trigger_time <= start_time <= onset.onset
+        assert onset.scheduled == pytest.approx(trigger_time)
+        assert onset.lateness == pytest.approx(onset.onset - trigger_time)
+        assert list(o.scheduler.events) == [onset]
+
+        # The next stimulation completes the previous one first.
+        o.stimulate(blocking_wait=True)
+        assert len(calls) == 4
+
+    def test_Trigger_hardware_timed_without_duration(self):
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True)
+        with pytest.raises(ValueError):
+            t.add_trigger('Onset', 5, duration=None)
+
+    def test_Trigger_software_timed(self):
+        t = Trigger(use_threads=False, test_mode=True)
+        t.add_trigger('Onset', 3, duration=0.001)
+        t.select_trigger('Onset')
+        t.trigger()
+
+        written = t._ni_task.written
+        assert len(written) == 2
+        assert written[0].tolist() == [[1, 1, 0, 0, 0, 0, 0, 0]]
+        assert written[1].tolist() == [[0] * 8]
+
+
+class TestTriggerLookupTable():
+    def setup_method(self):
+        self.t = Trigger(use_threads=False, test_mode=True)
+
+    def test_lookup_table(self):
+        lut = self.t._bitmask_lut
+        assert lut.shape == (256, 8)
+        assert lut.dtype == np.uint8
+        assert not lut.flags.writeable
+
+        for trig_num in (0, 1, 5, 128, 255):
+            expected = [int(b) for b in bin(trig_num)[2:].zfill(8)[::-1]]
+            assert lut[trig_num].tolist() == expected
+
+    def test_add_trigger(self):
+        self.t.add_trigger('Onset', 6)
+        self.t.add_trigger('Clipped', 1000)
+        assert self.t.stimuli[0]['bitmask'].tolist() == [0, 1, 1, 0,
+                                                         0, 0, 0, 0]
+        assert self.t.stimuli[1]['bitmask'].tolist() == [1] * 8
+
+        with pytest.raises(ValueError):
+            self.t.add_trigger('Negative', -1)
+
+    def test_send(self):
+        event = self.t.send(9, duration=0.001)
+        assert isinstance(event, ScheduledEvent)
+
+        written = self.t._ni_task.written
+        assert written[0].tolist() == [[1, 0, 0, 1, 0, 0, 0, 0]]
+        assert written[1].tolist() == [[0] * 8]
+
+    def test_send_without_duration(self):
+        self.t.send(255)
+        assert len(self.t._ni_task.written) == 1
+
+    def test_send_hardware_timed(self):
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True)
+        with pytest.raises(ValueError):
+            t.send(1)
+
+    @pytest.mark.parametrize('hardware_timed', [False, True])
+    def test_without_lookup_table(self, hardware_timed):
+        # Wide tasks compute the bitmasks on demand instead.
+        class WideTrigger(Trigger):
+            _max_lookup_table_bits = 4
+
+        t = WideTrigger(use_threads=False, test_mode=True,
+                        hardware_timed=hardware_timed)
+        assert t._bitmask_lut is None
+
+        lut = self.t._bitmask_lut
+        for code in (0, 1, 5, 128, 255):
+            assert t._get_bitmask(code).tolist() == lut[code].tolist()
+
+        t.add_trigger('Onset', 6, duration=0.001)
+        t.add_trigger('Clipped', 1000, duration=0.001)
+        assert t.stimuli[0]['bitmask'].tolist() == lut[6].tolist()
+        assert not t.stimuli[0]['bitmask'].flags.writeable
+        assert t.stimuli[1]['bitmask'].tolist() == lut[255].tolist()
+
+        sequence = [[1, 0, 0.002], [130, 0.003, 0.001]]
+        codes, onsets, offsets = t._compile_sequence(sequence)
+        waveform = t._compile_sequence_waveform(codes, onsets, offsets)[1]
+        expected = self.t._compile_sequence_waveform(
+            *self.t._compile_sequence(sequence))[1]
+        assert waveform.dtype == np.uint8
+        assert waveform.tolist() == expected.tolist()
+
+        if not hardware_timed:
+            t.send(9, duration=0.001)
+            t.send_sequence(sequence)
+            written = [w[0].tolist() for w in t._ni_task.written]
+            assert written == [lut[9].tolist(), [0] * 8,
+                               lut[1].tolist(), [0] * 8,
+                               lut[130].tolist(), [0] * 8]
+
+
+class TestTriggerSequence():
+    sequence = [[1, 0, 0.002],
+                [2, 0.003, 0.001],
+                [255, 0.005, 0.002]]
+
+    def test_software_timed(self):
+        t = Trigger(use_threads=False, test_mode=True)
+        start_time = t.scheduler.get_time() + 0.005
+        onsets = t.send_sequence(self.sequence, start_time=start_time)
+
+        assert onsets.shape == (3,)
+        assert (onsets >= start_time + np.array([0, 0.003, 0.005])).all()
+        assert len(t.scheduler.events) == 3
+
+        written = [w[0].tolist() for w in t._ni_task.written]
+        assert written == [[1, 0, 0, 0, 0, 0, 0, 0], [0] * 8,
+                           [0, 1, 0, 0, 0, 0, 0, 0], [0] * 8,
+                           [1] * 8, [0] * 8]
+
+    def test_hardware_timed(self):
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True,
+                    sample_rate=1000)
+        onsets = t.send_sequence(self.sequence)
+        assert np.allclose(np.diff(onsets), [0.003, 0.002])
+
+        waveform = t._ni_task.written[0]
+        codes = (waveform * 2**np.arange(8)).sum(axis=1)
+        assert codes.tolist() == [1, 1, 0, 2, 0, 255, 255, 0]
+        assert t._ni_task.sample_clock['samples_per_channel'] == 8
+
+    def test_hardware_timed_onsets_measured_after_start(self):
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True,
+                    sample_rate=1000)
+        start_times = []
+
+        def start():
+            start_times.append(t.scheduler.get_time())
+            return True
+
+        t._ni_task.start = start
+        start_time = t.scheduler.get_time() + 0.01
+        onsets = t.send_sequence(self.sequence, start_time=start_time)
+
+        assert start_time <= start_times[0] <= onsets[0]
+        assert t._ni_task.written[0].shape == (8, 8)
+
+    def test_with_threads(self):
+        t = Trigger(use_threads=True, test_mode=True)
+        future = t.send_sequence(self.sequence, blocking_wait=True)
+        assert future.result().shape == (3,)
+
+    @pytest.mark.parametrize('sequence', [
+        [],
+        [1, 0, 0.001],
+        [[-1, 0, 0.001]],
+        [[1.5, 0, 0.001]],
+        [[1, 0, 0]],
+        [[1, 0.01, 0.001], [2, 0, 0.001]],
+        [[1, 0, 0.002], [2, 0.001, 0.001]]
+    ])
+    def test_invalid_sequence(self, sequence):
+        t = Trigger(use_threads=False, test_mode=True)
+        with pytest.raises(ValueError):
+            t.send_sequence(sequence)
+
+    def test_overlap_after_rounding(self):
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True,
+                    sample_rate=100)
+        with pytest.raises(ValueError):
+            t.send_sequence([[1, 0, 0.001], [2, 0.001, 0.001]])
+
+    def test_adjacent_hardware_timed(self):
+        # Adjacent triggers with equal codes would merge into one pulse.
+        sequence = [[5, 0, 0.002], [5, 0.002, 0.002], [3, 0.004, 0.001]]
+        t = Trigger(use_threads=False, test_mode=True, hardware_timed=True,
+                    sample_rate=1000)
+        with pytest.raises(ValueError):
+            t.send_sequence(sequence)
+
+        t = Trigger(use_threads=False, test_mode=True)
+        t.send_sequence(sequence)
+        written = [w[0].tolist() for w in t._ni_task.written]
+        assert written[1] == [0] * 8
+
+
+class TestAnalogInput():
+    def test_get_data(self):
+        a = AnalogInput(sampling_duration=0.01, sampling_rate=1000,
+                        test_mode=True)
+        data = a.get_data()
+        assert data.shape == (10, 1)
+        assert data[:, 0].tolist() == list(range(10))
+
+    def test_continuous(self):
+        a = AnalogInput(sampling_rate=1000, test_mode=True)
+        a.start_continuous(buffer_duration=0.05, chunk_duration=0.005)
+        assert a.continuous
+
+        with pytest.raises(RuntimeError):
+            a.get_data()
+        with pytest.raises(RuntimeError):
+            a.sampling_rate = 500
+
+        while a.samples_acquired < 100:
+            time.sleep(0.005)
+        a.stop_continuous()
+        assert not a.continuous
+
+        # The ring buffer has wrapped around, but the latest samples are
+        # contiguous and without gaps.
+        n = a.samples_acquired
+        latest = a.get_latest(50)
+        assert latest.shape == (1, 50)
+        assert latest[0].tolist() == list(range(n - 50, n))
+        assert not latest.flags.writeable
+        assert not latest.flags.owndata
+
+        window = a.get_window((n - 20) / 1000, (n - 10) / 1000)
+        assert window[0].tolist() == list(range(n - 20, n - 10))
+
+        with pytest.raises(ValueError):
+            a.get_latest(51)
+        with pytest.raises(ValueError):
+            a.get_window(0, 0.01)
+
+        # Finite acquisition works again.
+        a.sampling_duration = 0.005
+        assert a.get_data().shape == (5, 1)
+
+    def test_get_data_async(self):
+        a = AnalogInput(sampling_duration=0.01, sampling_rate=1000,
+                        ni_trigger_line='Dev1/PFI0', test_mode=True)
+        futures = [a.get_data_async() for _ in range(3)]
+
+        for future in futures:
+            data = future.result()
+            assert data.shape == (10, 1)
+            assert data[:, 0].tolist() == list(range(10))
+
+        # The task has been re-armed for the next trial.
+        assert a._ni_task._start_time is not None
+
+    def test_get_data_out(self):
+        a = AnalogInput(sampling_duration=0.005, sampling_rate=1000,
+                        test_mode=True)
+        session = np.zeros((3, 5))
+
+        for trial in range(3):
+            row = session[trial]
+            assert a.get_data(out=row) is row
+        assert (session == np.arange(5)).all()
+
+        column = np.zeros((5, 2))
+        a.get_data(out=column[:, 1])
+        assert column[:, 1].tolist() == list(range(5))
+        assert (column[:, 0] == 0).all()
+
+        out = np.zeros((5, 1), dtype=np.float32)
+        assert a.get_data(out=out) is out
+
+        with pytest.raises(ValueError):
+            a.get_data(out=np.zeros(4))
+        with pytest.raises(ValueError):
+            a.get_data_async(out=np.zeros((5, 2)))
+
+    def test_get_data_async_out(self):
+        a = AnalogInput(sampling_duration=0.005, sampling_rate=1000,
+                        test_mode=True)
+        session = np.zeros((2, 5))
+        futures = [a.get_data_async(out=session[trial])
+                   for trial in range(2)]
+        for future in futures:
+            future.result()
+        assert (session == np.arange(5)).all()
+
+    def test_multiple_channels(self):
+        a = AnalogInput(ni_input_line=['Dev1/ai0:1', 'Dev1/ai4'],
+                        sampling_duration=0.005, sampling_rate=1000,
+                        scale=[1, 2, 10], offset=[0, 0, -1], test_mode=True)
+        assert a.number_of_channels == 3
+
+        expected = np.arange(5)[:, np.newaxis] * [1, 4, 30] + [0, 0, -1]
+        assert (a.get_data() == expected).all()
+
+        data = a.get_data(channels_first=True)
+        assert data.shape == (3, 5)
+        assert data.flags.c_contiguous
+        assert (data == expected.T).all()
+
+        out = np.zeros((3, 5))
+        a.get_data_async(out=out, channels_first=True).result()
+        assert (out == expected.T).all()
+
+        with pytest.raises(ValueError):
+            a.get_data(out=np.zeros((5, 3)), channels_first=True)
+        with pytest.raises(ValueError):
+            a.get_data(out=np.zeros(5))
+
+    def test_multiple_channels_continuous(self):
+        a = AnalogInput(ni_input_line='Dev1/ai0:1', sampling_rate=1000,
+                        scale=0.5, test_mode=True)
+        a.start_continuous(buffer_duration=0.1, chunk_duration=0.005)
+        while a.samples_acquired < 20:
+            time.sleep(0.005)
+        a.stop_continuous()
+
+        n = a.samples_acquired
+        latest = a.get_latest(10)
+        assert (latest == np.arange(n - 10, n) * [[0.5], [1]]).all()
+
+    def test_get_data_async_continuous(self):
+        a = AnalogInput(test_mode=True)
+        a.start_continuous(buffer_duration=0.1)
+        with pytest.raises(RuntimeError):
+            a.get_data_async()
+        a.stop_continuous()
+
+    def test_get_latest_without_acquisition(self):
+        a = AnalogInput(test_mode=True)
+        with pytest.raises(RuntimeError):
+            a.get_latest(1)
+        with pytest.raises(RuntimeError):
+            a.stop_continuous()
+
+
+class TestRingBuffer():
+    def test_wraparound(self):
+        ring_buffer = _RingBuffer(n_channels=2, capacity=5)
+        data = np.arange(24).reshape(2, 12)
+
+        for start in range(0, 12, 3):
+            ring_buffer.write(data[:, start:start + 3])
+
+        assert ring_buffer.samples_written == 12
+        assert (ring_buffer.get(7, 12) == data[:, 7:12]).all()
+        assert (ring_buffer.get(9, 11) == data[:, 9:11]).all()
+
+        with pytest.raises(ValueError):
+            ring_buffer.get(6, 12)
+        with pytest.raises(ValueError):
+            ring_buffer.get(10, 13)
+        with pytest.raises(ValueError):
+            ring_buffer.write(np.zeros((2, 6)))
+
+    def test_get_snapshot(self):
+        ring_buffer = _RingBuffer(n_channels=1, capacity=5)
+        ring_buffer.write(np.arange(5)[np.newaxis])
+        samples_written = ring_buffer.samples_written
+
+        # The writer adds a chunk after the number of samples was read.
+        ring_buffer.write(np.arange(5, 7)[np.newaxis])
+        with pytest.raises(ValueError):
+            ring_buffer.get(0, 5)
+        assert ring_buffer.get(0, 5, samples_written=samples_written).shape \
+            == (1, 5)
+
+
+class TestDataRecorder():
+    def test_write_and_load(self, tmpdir):
+        filename = str(tmpdir.join('recording'))
+        recorder = DataRecorder(filename, n_channels=2, sampling_rate=1000,
+                                participant='P01')
+        data = np.arange(20, dtype=np.float64).reshape(10, 2)
+
+        assert recorder.write(data[:4], trial=0)
+        assert recorder.write(data[4:].T.copy(), channels_first=True,
+                              trial=np.int64(1))
+        recorder.close()
+
+        recording = load_recording(filename)
+        assert isinstance(recording.data, np.memmap)
+        assert (recording.data == data).all()
+
+        metadata = recording.metadata
+        assert metadata['participant'] == 'P01'
+        assert metadata['sampling_rate'] == 1000
+        assert metadata['n_samples'] == 10
+        assert metadata['dropped_chunks'] == 0
+        assert metadata['chunks'] == [
+            dict(trial=0, first_sample=0, n_samples=4),
+            dict(trial=1, first_sample=4, n_samples=6)
+        ]
+
+        with pytest.raises(RuntimeError):
+            recorder.write(data)
+
+    def test_load_unclosed(self, tmpdir):
+        filename = str(tmpdir.join('recording'))
+        recorder = DataRecorder(filename, n_channels=1, sampling_rate=1000)
+        recorder.write(np.arange(5.), trial=0)
+        recorder.write(np.arange(5.), trial=1)
+
+        # The chunk metadata is written along with the data, so a crashed
+        # recording can be loaded without closing the recorder.
+        deadline = time.time() + 5
+        while (len(load_recording(filename).metadata['chunks']) < 2 and
+               time.time() < deadline):
+            time.sleep(0.001)
+
+        recording = load_recording(filename)
+        assert recording.data.shape == (10, 1)
+        assert [chunk['trial'] for chunk in
+                recording.metadata['chunks']] == [0, 1]
+        assert recording.metadata['n_samples'] == 0
+        recorder.close()
+
+        with open(filename + '.json') as f:
+            assert 'chunks' not in json.load(f)
+
+    def test_invalid_chunk(self, tmpdir):
+        recorder = DataRecorder(str(tmpdir.join('recording')), n_channels=2,
+                                sampling_rate=1000)
+        with pytest.raises(ValueError):
+            recorder.write(np.zeros(5))
+        with pytest.raises(ValueError):
+            recorder.write(np.zeros((5, 2)), channels_first=True)
+        recorder.close()
+
+    def test_load_empty(self, tmpdir):
+        filename = str(tmpdir.join('recording'))
+        DataRecorder(filename, n_channels=3, sampling_rate=1000).close()
+        assert load_recording(filename).data.shape == (0, 3)
+
+    def test_dropped_chunks(self, tmpdir, monkeypatch):
+        filename = str(tmpdir.join('recording'))
+        recorder = DataRecorder(filename, n_channels=1, sampling_rate=1000,
+                                max_queue_size=1)
+
+        # Simulate a slow disk.
+        disk_ready = threading.Event()
+        write_data = recorder._write_data
+
+        def slow_write_data(chunk):
+            disk_ready.wait()
+            write_data(chunk)
+
+        monkeypatch.setattr(recorder, '_write_data', slow_write_data)
+
+        with pytest.warns(RuntimeWarning):
+            queued = [recorder.write(np.ones(5)) for _ in range(3)]
+
+        assert not all(queued)
+        assert recorder.dropped_chunks == queued.count(False)
+
+        disk_ready.set()
+        recorder.close()
+
+        recording = load_recording(filename)
+        assert recording.data.shape == (5 * queued.count(True), 1)
+        assert recording.metadata['dropped_chunks'] == queued.count(False)
+
+    def test_AnalogInput_finite(self, tmpdir):
+        filename = str(tmpdir.join('recording'))
+        a = AnalogInput(ni_input_line='Dev1/ai0:1', sampling_duration=0.005,
+                        sampling_rate=1000, test_mode=True)
+        a.start_recording(filename, participant='P01')
+
+        start_time = time.time()
+        a.get_data()
+        a.get_data(channels_first=True)
+        a.get_data(out=np.zeros((5, 2)))
+        assert a.stop_recording() == 0
+        assert a.recorder is None
+
+        recording = load_recording(filename)
+        expected = np.arange(5)[:, np.newaxis] * [1, 2]
+        assert (recording.data == np.tile(expected, (3, 1))).all()
+        assert [chunk['trial'] for chunk in
+                recording.metadata['chunks']] == [0, 1, 2]
+        trigger_times = [chunk['trigger_time'] for chunk in
+                         recording.metadata['chunks']]
+        assert start_time <= trigger_times[0] < trigger_times[1]
+
+    def test_AnalogInput_external_trigger(self, tmpdir):
+        filename = str(tmpdir.join('recording'))
+        a = AnalogInput(ni_trigger_line='Dev1/PFI0', sampling_duration=0.005,
+                        sampling_rate=1000, test_mode=True)
+        a.start_recording(filename)
+        a.get_data()
+        a.stop_recording()
+
+        # The onset of an external trigger cannot be measured.
+        chunks = load_recording(filename).metadata['chunks']
+        assert chunks == [dict(trial=0, trigger_time=None, first_sample=0,
+                               n_samples=5)]
+
+    def test_AnalogInput_stop_during_async(self, tmpdir, monkeypatch):
+        filename = str(tmpdir.join('recording'))
+        a = AnalogInput(sampling_duration=0.005, sampling_rate=1000,
+                        test_mode=True)
+        a.start_recording(filename)
+
+        writing = threading.Event()
+        written = threading.Event()
+        write = a.recorder.write
+
+        def slow_write(*args, **kwargs):
+            writing.set()
+            written.wait()
+            return write(*args, **kwargs)
+
+        monkeypatch.setattr(a.recorder, 'write', slow_write)
+        future = a.get_data_async()
+        assert writing.wait(5)
+
+        # Stopping the recording waits for the trial to be handed over.
+        stopper = threading.Thread(target=a.stop_recording)
+        stopper.start()
+        stopper.join(0.05)
+        assert stopper.is_alive()
+
+        written.set()
+        stopper.join()
+        future.result()
+        assert load_recording(filename).data.shape == (5, 1)
+
+    def test_AnalogInput_continuous(self, tmpdir):
+        filename = str(tmpdir.join('recording'))
+        a = AnalogInput(sampling_rate=1000, test_mode=True)
+        a.start_recording(filename)
+        with pytest.raises(RuntimeError):
+            a.start_recording(filename)
+
+        a.start_continuous(buffer_duration=0.02, chunk_duration=0.005)
+        while a.samples_acquired < 50:
+            time.sleep(0.005)
+        a.stop_continuous()
+        a.stop_recording()
+
+        # Everything was recorded, even though the ring buffer only holds
+        # the last 20 samples.
+        recording = load_recording(filename)
+        n = a.samples_acquired
+        assert recording.data[:, 0].tolist() == list(range(n))
+        assert [chunk['acquisition_sample'] for chunk in
+                recording.metadata['chunks']] == list(range(0, n, 5))
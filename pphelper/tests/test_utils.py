@@ -3,8 +3,10 @@
 from __future__ import unicode_literals
 import numpy as np
 import pandas as pd
+import pytest
 from pphelper.utils import (add_zero_padding, get_max_from_list,
-                            join_multi_level_index, find_nearest)
+                            join_multi_level_index, find_nearest,
+                            find_nearest_many, epoch_signal)
 
 
 def test_add_zero_padding_no_args():
@@ -38,6 +40,26 @@ def test_add_zero_padding_length_too_short():
     assert result.index.equals(expected_result.index)
 
 
+def test_add_zero_padding_missing_values():
+    data = [1, np.nan, 3]
+    expected_result = pd.Series(['1.0', 'nan', '3.0'])
+    result = add_zero_padding(data)
+    assert result.equals(expected_result)
+
+
+def test_add_zero_padding_categorical():
+    participants = [1, 2, 2, 1, 3]
+    expected_result = pd.Series(['001', '002', '002', '001', '003'],
+                                dtype='category')
+    result = add_zero_padding(participants, categorical=True)
+    assert result.equals(expected_result)
+    assert list(result.cat.categories) == ['001', '002', '003']
+
+    result = add_zero_padding(participants, categorical=True,
+                              return_series=False)
+    assert isinstance(result, pd.Categorical)
+
+
 def test_get_max_from_list():
     data = [range(10),
             range(1, 50),
@@ -49,6 +71,24 @@ def test_get_max_from_list():
     assert result == result_expected
 
 
+def test_get_max_from_list_return_min():
+    data = (np.array(x) for x in [[3, 7.5], [], [-2, 4], [np.nan]])
+
+    result = get_max_from_list(data, return_min=True)
+    assert np.isnan(result[0])
+    assert np.isnan(result[1])
+
+    data = (np.array(x) for x in [[3, 7.5], [], [-2, 4]])
+    result_expected = (-2, 7.5)
+    result = get_max_from_list(data, return_min=True)
+    assert result == result_expected
+
+
+def test_get_max_from_list_empty():
+    with pytest.raises(ValueError):
+        get_max_from_list([[], []])
+
+
 def test_join_multi_level_index():
     idx = pd.MultiIndex.from_arrays(
         [['foo_1', 'bar_1', 'baz_1'],
@@ -57,13 +97,28 @@ def test_join_multi_level_index():
         names=['idx_1', 'idx_2', 'idx_3']
     )
 
-    result_expected = ['foo_1-foo_2-foo_3',
-                       'bar_1-bar_2-bar_3',
-                       'baz_1-baz_2-baz_3']
+    result_expected = pd.Index(['foo_1-foo_2-foo_3',
+                                'bar_1-bar_2-bar_3',
+                                'baz_1-baz_2-baz_3'])
 
     result = join_multi_level_index(idx, sep='-')
 
-    assert result == result_expected
+    assert result.equals(result_expected)
+
+
+def test_join_multi_level_index_non_string_levels():
+    idx = pd.MultiIndex.from_arrays(
+        [['RT', 'RT', 'acc', None],
+         [1, 2, 1, 2],
+         [0.5, 0.5, 1.5, 1.5]]
+    )
+
+    result_expected = pd.Index(['RT_1_0.5', 'RT_2_0.5',
+                                'acc_1_1.5', 'nan_2_1.5'])
+
+    result = join_multi_level_index(idx)
+
+    assert result.equals(result_expected)
 
 
 def test_find_nearest():
@@ -104,6 +159,78 @@ def test_find_nearest_return_index():
     assert result == result_expected
 
 
+def test_find_nearest_many():
+    a = np.array([3, 1, 2, 2, 5])
+    x = np.array([2, 1.3, 2.5, -1, 10, 4])
+
+    idx_expected = np.array([2, 1, 0, 1, 4, 0])
+    values_expected = np.array([2, 1, 3, 1, 5, 3])
+    idx, values = find_nearest_many(a, x)
+    assert np.array_equal(idx, idx_expected)
+    assert np.array_equal(values, values_expected)
+
+    sorter = np.argsort(a, kind='mergesort')
+    idx, values = find_nearest_many(a, x, sorter=sorter)
+    assert np.array_equal(idx, idx_expected)
+    assert np.array_equal(values, values_expected)
+
+
+def test_find_nearest_many_sorted():
+    a = np.arange(0, 10, 0.5)
+    x = np.random.uniform(-1, 11, size=100)
+
+    idx, values = find_nearest_many(a, x, is_sorted=True)
+    for i, x_ in enumerate(x):
+        assert (idx[i], values[i]) == find_nearest(a, x_, return_index=True)
+
+
+def test_epoch_signal():
+    sampling_rate = 100
+    signal = np.arange(1000, dtype=np.float64)
+    event_times = np.array([1, 2.5, 7.123])
+
+    data, times = epoch_signal(signal, sampling_rate, event_times,
+                               tmin=-0.1, tmax=0.2)
+
+    assert data.shape == (3, 31)
+    assert np.allclose(times, np.arange(-10, 21) / sampling_rate)
+    assert np.array_equal(data[0], signal[90:121])
+    assert np.array_equal(data[1], signal[240:271])
+    assert np.array_equal(data[2], signal[702:733])
+
+
+def test_epoch_signal_multichannel_baseline():
+    sampling_rate = 10
+    signal = np.array([np.arange(100), 2 * np.arange(100)])
+    out = np.empty((2, 2, 6))
+
+    data, times = epoch_signal(signal, sampling_rate, [2, 5], tmin=-0.2,
+                               tmax=0.3, baseline=(None, 0), out=out)
+
+    assert data is out
+    assert np.allclose(times, [-0.2, -0.1, 0, 0.1, 0.2, 0.3])
+    assert np.array_equal(data[0, 0], [-1, 0, 1, 2, 3, 4])
+    assert np.array_equal(data[1, 1], [-2, 0, 2, 4, 6, 8])
+
+
+def test_epoch_signal_signal_times():
+    signal = np.arange(20)
+    signal_times = np.arange(20) * 0.1 + 0.05
+
+    data, _ = epoch_signal(signal, 10, [0.5, 1.01], tmin=0, tmax=0.2,
+                           signal_times=signal_times)
+
+    assert np.array_equal(data, [[4, 5, 6], [10, 11, 12]])
+
+
+def test_epoch_signal_out_of_bounds():
+    with pytest.raises(ValueError):
+        epoch_signal(np.arange(100), 10, [0.1], tmin=-0.2, tmax=0.2)
+
+    with pytest.raises(ValueError):
+        epoch_signal(np.arange(100), 10, [9.9], tmin=-0.2, tmax=0.2)
+
+
 if __name__ == '__main__':
     import pytest
     pytest.main()
@@ -8,13 +8,12 @@ datasets.
 
 from __future__ import division, unicode_literals
 import sys
-import pandas as pd
-import itertools
 from collections import namedtuple
 import numpy as np
 
 
-def add_zero_padding(data, length=3, return_series=True):
+def add_zero_padding(data, length=3, return_series=True,
+                     categorical=False):
     """
     Convert input values to strings and add a zero-padding.
 
@@ -27,12 +26,17 @@ def add_zero_padding(data, length=3, return_series=True):
     return_series : bool, optional
         If `True`, return a pandas `Series` object. If false, return a
         numpy array.
+    categorical : bool, optional
+        If `True`, return the padded values as a categorical, which
+        requires much less memory if values occur repeatedly (e.g.,
+        participant IDs in trial-level data).
 
     Returns
     -------
     result : Series or ndarray
         The padded input vector. All strings are created as unicode
-        literals.
+        literals. If `categorical` is `True` and `return_series` is `False`,
+        a pandas `Categorical` is returned.
 
     Notes
     -----
@@ -41,13 +45,29 @@ def add_zero_padding(data, length=3, return_series=True):
     obviously not be zero-padded, but they will also not be truncated.
 
     """
+    # pandas is slow to import, so only import it when required.
+    import pandas as pd
+
     data = pd.Series(data)
 
     # Unicode is the default in Python >= 3.0.
     if sys.version_info > (3, 0):
-        result = data.apply(lambda x: str(x).zfill(length))
+        text_type = str
     else:
-        result = data.apply(lambda x: unicode(x).zfill(length))
+        text_type = unicode
+
+    result = data.astype(text_type)
+
+    # Depending on the pandas version, astype() may retain missing values
+    # instead of converting them to strings (e.g., 'nan' or 'None').
+    missing = data.isnull()
+    if missing.any():
+        result = result.where(~missing, data[missing].map(text_type))
+
+    result = result.str.zfill(length)
+
+    if categorical:
+        result = result.astype('category')
 
     if return_series:
         return result
@@ -55,31 +75,66 @@ def add_zero_padding(data, length=3, return_series=True):
         return result.values
 
 
-def get_max_from_list(x):
+def get_max_from_list(x, return_min=False):
     """
     Return the maximum value from a list or a list of lists.
 
     Parameters
     ----------
-    x : list
-        A list or a list of lists.
+    x : iterable
+        A list or a list of lists (or arrays). Generators are accepted,
+        too.
+    return_min : bool, optional
+        Whether to return the minimum value as well.
 
     Returns
     -------
-    float
-        The maximum value.
+    float or tuple
+        The maximum value, or a tuple of the minimum and the maximum value
+        if `return_min=True`.
+
+    Notes
+    -----
+    The maximum (and minimum) are determined for each element of `x`
+    separately and then combined, so the elements are never concatenated
+    into one large temporary array.
 
     """
-    return np.array(list(itertools.chain.from_iterable(x))).max()
+    minimum = None
+    maximum = None
+
+    for values in x:
+        values = np.asarray(values)
+        if values.size == 0:
+            continue
+
+        if maximum is None:
+            maximum = values.max()
+            if return_min:
+                minimum = values.min()
+        else:
+            maximum = np.maximum(maximum, values.max())
+            if return_min:
+                minimum = np.minimum(minimum, values.min())
+
+    if maximum is None:
+        raise ValueError('Cannot determine the maximum of an empty list.')
+
+    if return_min:
+        return minimum, maximum
+    else:
+        return maximum
 
 
 def join_multi_level_index(index, sep='_'):
     """
+    Join the levels of a MultiIndex into a flat index of strings.
 
     Parameters
     ----------
     index : MultiIndex
-        The index to join.
+        The index to join. Levels that do not contain strings will be
+        converted to strings.
 
     sep : string, optional
         The separator to insert between the joined index.
@@ -87,9 +142,35 @@ def join_multi_level_index(index, sep='_'):
 
     Returns
     -------
-    The joined index.
+    Index
+        The joined index.
+
+    Notes
+    -----
+    The index is processed level by level: only the unique values of each
+    level are converted to strings, and the levels are then concatenated
+    using vectorized string operations.
+
     """
-    return [sep.join(x) for x in index]
+    # pandas is slow to import, so only import it when required.
+    import pandas as pd
+
+    if not isinstance(index, pd.MultiIndex):
+        return pd.Index(index.astype(str))
+
+    result = None
+
+    for level, codes in zip(index.levels, index.codes):
+        # Missing values have the code -1, i.e. they are mapped to the
+        # last element, 'nan'.
+        values = np.append(level.astype(str), 'nan').astype(str)[codes]
+
+        if result is None:
+            result = values
+        else:
+            result = np.char.add(np.char.add(result, sep), values)
+
+    return pd.Index(result.astype(object))
 
 
 def find_nearest(a, x, return_index=False):
@@ -120,3 +201,224 @@ def find_nearest(a, x, return_index=False):
         return idx, a.flat[idx]
     else:
         return a.flat[idx]
+
+
+def find_nearest_many(a, x, is_sorted=False, sorter=None):
+    """
+    Find the elements in array `a` closest to each of the values in `x`.
+
+    This is a vectorized version of `find_nearest`. The elements are
+    located via binary search, so each query takes O(log n) time.
+
+    Parameters
+    ----------
+    a : NDarray
+        A numpy array.
+
+    x : array_like
+        The values to look up.
+
+    is_sorted : bool, optional
+        Whether `a` is already sorted in ascending order. If `False` and no
+        `sorter` is supplied, `a` will be sorted first, which takes
+        O(n log n) time.
+
+    sorter : NDarray, optional
+        The indices that sort `a` in ascending order, as returned by
+        ``np.argsort(a, kind='mergesort')``. Pass this to avoid sorting
+        `a` again when looking up values repeatedly. Ignored if `is_sorted`
+        is `True`.
+
+    Returns
+    -------
+    tuple
+        The indices of the matching elements and their values, both in the
+        shape of `x`.
+
+    Notes
+    -----
+    Just like `find_nearest`, the first matching element (i.e., the one
+    with the smallest index) is returned if several elements are equally
+    close.
+
+    See Also
+    --------
+    find_nearest
+
+    """
+    a = np.asarray(a).ravel()
+    x = np.asarray(x)
+
+    if a.size == 0:
+        raise ValueError('`a` must not be empty.')
+
+    if is_sorted:
+        sorter = None
+    elif sorter is None:
+        sorter = np.argsort(a, kind='mergesort')
+
+    if sorter is None:
+        a_sorted = a
+    else:
+        a_sorted = a[sorter]
+
+    # The candidates are the closest elements to the left and to the right
+    # of each value. For the left candidate, we look up the first element
+    # of a run of duplicates.
+    right = np.clip(np.searchsorted(a_sorted, x), 1, max(a.size - 1, 1))
+    right = np.minimum(right, a.size - 1)
+    left = np.searchsorted(a_sorted, a_sorted[right - 1])
+    left = np.minimum(left, right)
+
+    distance_left = np.abs(x - a_sorted[left])
+    distance_right = np.abs(a_sorted[right] - x)
+
+    if sorter is not None:
+        left = sorter[left]
+        right = sorter[right]
+
+    idx = np.where(distance_left < distance_right, left,
+                   np.where(distance_left > distance_right, right,
+                            np.minimum(left, right)))
+
+    return idx, a[idx]
+
+
+_Epochs = namedtuple('Epochs', 'data times')
+
+
+def epoch_signal(signal, sampling_rate, event_times, tmin=-0.2, tmax=0.5,
+                 baseline=None, signal_times=None, out=None):
+    """
+    Cut windows ("epochs") around a set of events out of a continuous
+    signal.
+
+    Parameters
+    ----------
+    signal : array_like
+        The continuous signal, either of shape ``(n_samples,)`` or of shape
+        ``(n_channels, n_samples)``.
+
+    sampling_rate : float
+        The sampling rate of the signal, in Hz.
+
+    event_times : array_like
+        The event times, in seconds. Unless `signal_times` is specified,
+        the first sample of `signal` is assumed to have been acquired at
+        time zero.
+
+    tmin, tmax : float, optional
+        The start and end of the epochs relative to the events, in seconds.
+        Both are included in the epochs.
+        Default to -0.2 and 0.5 seconds, respectively.
+
+    baseline : tuple of floats, optional
+        The start and end of the baseline period relative to the events, in
+        seconds. The mean of this period is subtracted from each epoch.
+        ``None`` may be used to refer to the start (`tmin`) or the event
+        (zero), respectively. If `baseline` itself is ``None``, do not
+        apply a baseline correction.
+
+    signal_times : array_like, optional
+        The acquisition time of each sample, in seconds, in ascending
+        order. If specified, each event is aligned to the sample closest to
+        it (see `find_nearest_many`). Use this if the timestamps of the
+        events and the signal are not derived from the same clock, e.g.
+        when the signal was acquired in several chunks.
+
+    out : NDarray, optional
+        A preallocated array of shape
+        ``(n_events, [n_channels,] n_epoch_samples)`` to store the epochs in.
+        Must be of floating-point type if a baseline correction is applied.
+        If its data type differs from the data type of `signal`, an
+        intermediate copy of the epochs is made.
+
+    Returns
+    -------
+    namedtuple
+        A namedtuple containing the epochs, of shape
+        ``(n_events, [n_channels,] n_epoch_samples)``, and the times of the
+        epoch samples relative to the events.
+
+    Notes
+    -----
+    The epochs are extracted from a strided view of `signal`, which
+    contains every possible window without copying any data, in a single
+    vectorized operation.
+
+    See Also
+    --------
+    find_nearest_many
+
+    """
+    signal = np.asarray(signal)
+    event_times = np.asarray(event_times)
+    n_samples = signal.shape[-1]
+
+    start_offset = int(round(tmin * sampling_rate))
+    stop_offset = int(round(tmax * sampling_rate))
+    n_epoch_samples = stop_offset - start_offset + 1
+
+    if n_epoch_samples < 1:
+        raise ValueError('`tmax` must not be less than `tmin`.')
+
+    if n_epoch_samples > n_samples:
+        raise ValueError('The epochs are longer than the signal.')
+
+    if signal_times is None:
+        event_samples = np.rint(event_times * sampling_rate).astype(np.intp)
+    else:
+        event_samples, _ = find_nearest_many(signal_times, event_times,
+                                             is_sorted=True)
+
+    starts = event_samples + start_offset
+    if (starts.min() < 0) or (starts.max() > n_samples - n_epoch_samples):
+        raise ValueError('At least one epoch exceeds the signal '
+                         'boundaries.')
+
+    # A view of all possible windows, of shape
+    # (n_windows, [n_channels,] n_epoch_samples).
+    sample_stride = signal.strides[-1]
+    windows = np.lib.stride_tricks.as_strided(
+        signal,
+        shape=((n_samples - n_epoch_samples + 1,) + signal.shape[:-1] +
+               (n_epoch_samples,)),
+        strides=(sample_stride,) + signal.strides[:-1] + (sample_stride,),
+        writeable=False
+    )
+
+    if (out is None) or (out.dtype == signal.dtype):
+        # The bounds have been checked already, so we can use mode='clip',
+        # which writes to `out` directly instead of using a buffer.
+        data = np.take(windows, starts, axis=0, out=out, mode='clip')
+    else:
+        data = out
+        data[...] = windows[starts]
+
+    if baseline is not None:
+        baseline_start, baseline_stop = baseline
+        if baseline_start is None:
+            baseline_start = tmin
+        if baseline_stop is None:
+            baseline_stop = 0
+
+        baseline_start = max(
+            int(round(baseline_start * sampling_rate)) - start_offset, 0
+        )
+        baseline_stop = min(
+            int(round(baseline_stop * sampling_rate)) - start_offset + 1,
+            n_epoch_samples
+        )
+
+        if baseline_start >= baseline_stop:
+            raise ValueError('The baseline period must overlap with the '
+                             'epochs.')
+
+        if out is None and not np.issubdtype(data.dtype, np.floating):
+            data = data.astype(np.float64)
+
+        data -= data[..., baseline_start:baseline_stop].mean(axis=-1,
+                                                            keepdims=True)
+
+    times = np.arange(start_offset, stop_offset + 1) / sampling_rate
+    return _Epochs(data, times)
@@ -25,8 +25,10 @@ setup(
     long_description=open('README.rst').read(),
     install_requires=['pandas', 'numpy'],
     extras_require = {
-        'hardware':  ['psychopy', 'pylibnidaqmx'],
-        'image': ['pyfftw', 'scipy', 'matplotlib', 'pillow'],
+        'hardware':  ['psychopy', 'pylibnidaqmx',
+                      'futures; python_version < "3"'],
+        'image': ['pyfftw', 'scipy', 'matplotlib', 'pillow',
+                  'futures; python_version < "3"'],
         'doc': ['sphinx'],
     },
     classifiers=['Intended Audience :: Science/Research',